@@ -0,0 +1,451 @@
+"""
+EshopBot uchun yuklama testi va benchmark.
+
+`main.dp` soxta (fake) Telegram Bot API serveri va soxta Django backendiga qarshi
+ishga tushiriladi. Har bir virtual foydalanuvchi to'liq sayohatni bosib o'tadi:
+/start → kontakt → kategoriya → mahsulot → miqdor → savatcha → buyurtma →
+manzil → to'lov → buyurtmalar tarixi.
+
+Ishga tushirish:
+    python benchmark.py --journeys 200 --concurrency 20 --products 500 --backend-latency 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import socket
+import statistics
+import time
+from collections import defaultdict
+
+from aiohttp import web
+
+BENCH_TOKEN = "123456:BENCHMARK-TOKEN"
+BASE_USER_ID = 10_000_000
+
+# Soxta serverlar aniq manzillarni kutadi
+USERS_ENDPOINT = "/api/users/bot-users"
+CATEGORIES_ENDPOINT = "/api/products/categories/"
+PRODUCTS_ENDPOINT = "/api/products/products/"
+ORDER_GROUPS_ENDPOINT = "/api/orders/order-groups/"
+ORDERS_ENDPOINT = "/api/orders/orders/"
+
+
+def percentile(values, pct):
+    """Foiz bo'yicha qiymat (nearest-rank: ceil(pct/100 * n)-chi element)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # pct * n avval ko'paytiriladi: 7 / 100 * 100 kabi suzuvchi xatolar ceil natijasini buzmasin
+    return ordered[max(0, math.ceil(pct * len(ordered) / 100) - 1)]
+
+
+def _bind_socket():
+    """Bo'sh portga bog'langan socket"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    return sock
+
+
+def _route(app, method, path, handler):
+    """Yo'lni oxirida '/' bilan ham, '/'siz ham ro'yxatdan o'tkazish"""
+    path = path.rstrip("/")
+    app.router.add_route(method, path, handler)
+    app.router.add_route(method, f"{path}/", handler)
+
+
+# 🗄 Soxta backend
+class FakeBackend:
+    """users/categories/products/order-groups/orders endpointlarini xotirada saqlaydi"""
+
+    def __init__(self, categories=10, products=200, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.calls_by_path = defaultdict(int)
+        self.categories = [{"id": i, "name": f"Kategoriya {i}"} for i in range(1, categories + 1)]
+        self.products = {}
+        for i in range(1, products + 1):
+            category = self.categories[(i - 1) % categories]
+            self.products[i] = {
+                "id": i,
+                "name": f"Mahsulot {i}",
+                "price": f"{1000 + i * 10}.00",
+                "category_name": category["name"],
+                "stock": 100,
+                "description": f"Mahsulot {i} tavsifi",
+                "image": None,
+            }
+        self.users = {}
+        self.order_groups = {}
+        self.orders_created = 0
+
+    def build_app(self):
+        app = web.Application(middlewares=[self._middleware])
+        _route(app, "GET", USERS_ENDPOINT, self.list_users)
+        _route(app, "POST", USERS_ENDPOINT, self.create_user)
+        _route(app, "GET", CATEGORIES_ENDPOINT, self.list_categories)
+        _route(app, "GET", PRODUCTS_ENDPOINT, self.list_products)
+        _route(app, "GET", f"{PRODUCTS_ENDPOINT.rstrip('/')}/{{product_id}}", self.get_product)
+        _route(app, "GET", ORDER_GROUPS_ENDPOINT, self.list_order_groups)
+        _route(app, "POST", ORDER_GROUPS_ENDPOINT, self.create_order_group)
+        _route(app, "POST", ORDERS_ENDPOINT, self.create_order)
+        return app
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        self.calls += 1
+        self.calls_by_path[f"{request.method} {request.path}"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return await handler(request)
+
+    async def list_users(self, request):
+        chat_id = request.query.get("chat_id")
+        user = self.users.get(chat_id)
+        return web.json_response([user] if user else [])
+
+    async def create_user(self, request):
+        data = await request.json()
+        user = {"id": len(self.users) + 1, **data}
+        self.users[str(data["chat_id"])] = user
+        return web.json_response(user, status=201)
+
+    async def list_categories(self, request):
+        return web.json_response(self.categories)
+
+    async def list_products(self, request):
+        return web.json_response(list(self.products.values()))
+
+    async def get_product(self, request):
+        product = self.products.get(int(request.match_info["product_id"]))
+        if product is None:
+            return web.json_response({"detail": "Not found."}, status=404)
+        return web.json_response(product)
+
+    async def list_order_groups(self, request):
+        chat_id = request.query.get("chat_id")
+        user = self.users.get(chat_id)
+        if user is None:
+            return web.json_response([])
+        groups = [g for g in self.order_groups.values() if g["bot_user"] == user["id"]]
+        return web.json_response(groups)
+
+    async def create_order_group(self, request):
+        data = await request.json()
+        group_id = len(self.order_groups) + 1
+        group = {
+            "id": group_id,
+            **data,
+            "total_price": f"{data['total_price']:.2f}",
+            "orders": [],
+        }
+        self.order_groups[group_id] = group
+        return web.json_response(group, status=201)
+
+    async def create_order(self, request):
+        data = await request.json()
+        group = self.order_groups.get(data["order_group"])
+        if group is None:
+            return web.json_response({"order_group": ["Invalid pk."]}, status=400)
+        self.orders_created += 1
+        order = {"id": self.orders_created, **data, "subtotal": f"{data['subtotal']:.2f}"}
+        group["orders"].append(order)
+        return web.json_response(order, status=201)
+
+
+# ✈️ Soxta Telegram Bot API
+class FakeTelegram:
+    """Bot API metodlariga minimal, ammo aiogram tomonidan qabul qilinadigan javoblar qaytaradi"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.calls_by_method = defaultdict(int)
+        self._message_id = 0
+
+    def build_app(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    def _message(self, chat_id):
+        self._message_id += 1
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id or 0), "type": "private"},
+        }
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        self.calls += 1
+        self.calls_by_method[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        data = await request.post()
+        if method in ("sendMessage", "sendPhoto", "sendInvoice", "editMessageText", "editMessageCaption"):
+            result = self._message(data.get("chat_id"))
+        elif method == "getUserProfilePhotos":
+            result = {"total_count": 0, "photos": []}
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+
+# 🧭 Foydalanuvchi sayohati
+class Journey:
+    """Bitta virtual foydalanuvchi uchun Update'larni tuzish va ketma-ket yuborish"""
+
+    def __init__(self, index, backend):
+        self.user_id = BASE_USER_ID + index
+        self.backend = backend
+        self._seq = 0
+
+    def _next_id(self):
+        self._seq += 1
+        return self.user_id * 100 + self._seq
+
+    def _user(self):
+        return {"id": self.user_id, "is_bot": False, "first_name": f"User{self.user_id}"}
+
+    def _chat(self):
+        return {"id": self.user_id, "type": "private", "first_name": f"User{self.user_id}"}
+
+    def message(self, **fields):
+        return {
+            "update_id": self._next_id(),
+            "message": {
+                "message_id": self._next_id(),
+                "date": int(time.time()),
+                "chat": self._chat(),
+                "from": self._user(),
+                **fields,
+            },
+        }
+
+    def callback(self, data):
+        return {
+            "update_id": self._next_id(),
+            "callback_query": {
+                "id": str(self._next_id()),
+                "from": self._user(),
+                "chat_instance": str(self.user_id),
+                "data": data,
+                "message": {
+                    "message_id": self._next_id(),
+                    "date": int(time.time()),
+                    "chat": self._chat(),
+                    "from": {"id": 123456, "is_bot": True, "first_name": "EshopBot"},
+                    "text": "-",
+                },
+            },
+        }
+
+    def pre_checkout(self, total_amount):
+        return {
+            "update_id": self._next_id(),
+            "pre_checkout_query": {
+                "id": str(self._next_id()),
+                "from": self._user(),
+                "currency": "UZS",
+                "total_amount": total_amount,
+                "invoice_payload": f"order_{self.user_id}",
+            },
+        }
+
+    def steps(self):
+        """(qadam nomi, update) juftliklari"""
+        category = self.backend.categories[self.user_id % len(self.backend.categories)]
+        product = next(p for p in self.backend.products.values() if p["category_name"] == category["name"])
+        total_amount = int(float(product["price"]) * 2 * 100)
+        return [
+            ("start", lambda: self.message(text="/start", entities=[{"type": "bot_command", "offset": 0, "length": 6}])),
+            ("contact", lambda: self.message(contact={
+                "phone_number": f"+998{self.user_id}",
+                "first_name": f"User{self.user_id}",
+                "user_id": self.user_id,
+            })),
+            ("category", lambda: self.message(text=category["name"])),
+            ("product", lambda: self.callback(f"product_{product['id']}")),
+            ("qty_increase", lambda: self.callback("qty_increase")),
+            ("add_to_cart", lambda: self.callback("add_to_cart")),
+            ("cart", lambda: self.message(text="🛍 Savatchani ko'rish")),
+            ("place_order", lambda: self.callback("place_order")),
+            ("address", lambda: self.message(text="Toshkent, Amir Temur ko'chasi, 1-uy")),
+            ("pre_checkout", lambda: self.pre_checkout(total_amount)),
+            ("payment", lambda: self.message(successful_payment={
+                "currency": "UZS",
+                "total_amount": total_amount,
+                "invoice_payload": f"order_{self.user_id}",
+                "telegram_payment_charge_id": f"tg_{self.user_id}",
+                "provider_payment_charge_id": f"pp_{self.user_id}",
+            })),
+            ("orders", lambda: self.message(text="📜 Buyurtmalarim")),
+        ]
+
+
+async def run_journeys(dp, bot, backend, journeys, concurrency):
+    from aiogram.types import Update
+
+    journey_latencies = []
+    step_latencies = defaultdict(list)
+    errors = defaultdict(int)
+    queue = asyncio.Queue()
+    for i in range(journeys):
+        queue.put_nowait(i)
+
+    async def worker():
+        while True:
+            try:
+                index = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            journey = Journey(index, backend)
+            started = time.perf_counter()
+            try:
+                for name, build in journey.steps():
+                    update = Update.model_validate(build(), context={"bot": bot})
+                    step_started = time.perf_counter()
+                    await dp.feed_update(bot, update)
+                    step_latencies[name].append(time.perf_counter() - step_started)
+            except Exception as e:
+                errors[type(e).__name__] += 1
+                logging.debug(f"Sayohat xatosi: user_id={journey.user_id}: {e}")
+                continue
+            journey_latencies.append(time.perf_counter() - started)
+
+    wall_started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - wall_started
+    return journey_latencies, step_latencies, errors, wall
+
+
+async def run(args):
+    # main.py import qilinishidan oldin: haqiqiy Telegram'ga hech qachon murojaat qilinmasin
+    os.environ["API_TOKEN"] = BENCH_TOKEN
+    backend_sock = _bind_socket()
+    telegram_sock = _bind_socket()
+    backend_url = f"http://127.0.0.1:{backend_sock.getsockname()[1]}"
+    telegram_url = f"http://127.0.0.1:{telegram_sock.getsockname()[1]}"
+    os.environ["BASE_API_URL"] = backend_url
+    os.environ["USERS_ENDPOINT"] = USERS_ENDPOINT
+    os.environ["CATEGORIES_ENDPOINT"] = CATEGORIES_ENDPOINT
+    os.environ["PRODUCTS_ENDPOINT"] = PRODUCTS_ENDPOINT
+    os.environ["ORDER_GROUPS_ENDPOINT"] = ORDER_GROUPS_ENDPOINT
+    os.environ["ORDERS_ENDPOINT"] = ORDERS_ENDPOINT
+
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.enums import ParseMode
+    import main
+
+    logging.getLogger().setLevel(args.log_level)
+
+    backend = FakeBackend(args.categories, args.products, args.backend_latency / 1000)
+    telegram = FakeTelegram(args.telegram_latency / 1000)
+    runners = []
+    for app, sock in ((backend.build_app(), backend_sock), (telegram.build_app(), telegram_sock)):
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.SockSite(runner, sock).start()
+        runners.append(runner)
+
+    session = AiohttpSession(
+        api=TelegramAPIServer.from_base(telegram_url), json_loads=main.json_loads, json_dumps=main.json_dumps
+    )
+    bot = Bot(token=BENCH_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    # Handlerlar global `bot` dan foydalanadi (send_invoice, answer_pre_checkout_query)
+    original_bot = main.bot
+    main.bot = bot
+
+    try:
+        latencies, step_latencies, errors, wall = await run_journeys(
+            main.dp, bot, backend, args.journeys, args.concurrency
+        )
+    finally:
+        main.bot = original_bot
+        await session.close()
+        await original_bot.session.close()
+        for runner in runners:
+            await runner.cleanup()
+
+    completed = len(latencies)
+    report = {
+        "journeys": args.journeys,
+        "completed": completed,
+        "errors": dict(errors),
+        "concurrency": args.concurrency,
+        "categories": args.categories,
+        "products": args.products,
+        "backend_latency_ms": args.backend_latency,
+        "telegram_latency_ms": args.telegram_latency,
+        "wall_seconds": round(wall, 3),
+        "throughput_journeys_per_s": round(completed / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "mean": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        },
+        "steps_ms": {
+            name: {
+                "p50": round(percentile(values, 50) * 1000, 2),
+                "p95": round(percentile(values, 95) * 1000, 2),
+                "p99": round(percentile(values, 99) * 1000, 2),
+            }
+            for name, values in step_latencies.items()
+        },
+        "backend_calls": backend.calls,
+        "backend_calls_per_journey": round(backend.calls / args.journeys, 2) if args.journeys else 0.0,
+        "backend_calls_by_path": dict(backend.calls_by_path),
+        "telegram_calls": telegram.calls,
+        "telegram_calls_per_journey": round(telegram.calls / args.journeys, 2) if args.journeys else 0.0,
+        "telegram_calls_by_method": dict(telegram.calls_by_method),
+        "orders_created": backend.orders_created,
+    }
+    return report
+
+
+def print_report(report):
+    print(f"Sayohatlar: {report['completed']}/{report['journeys']} (parallel: {report['concurrency']}), "
+          f"xatolar: {report['errors'] or 0}")
+    print(f"Katalog: {report['categories']} kategoriya, {report['products']} mahsulot; "
+          f"kechikish: backend {report['backend_latency_ms']} ms, telegram {report['telegram_latency_ms']} ms")
+    print(f"Vaqt: {report['wall_seconds']:.3f} s, o'tkazuvchanlik: {report['throughput_journeys_per_s']} sayohat/s")
+    lat = report["latency_ms"]
+    print(f"Sayohat kechikishi (ms): p50={lat['p50']} p95={lat['p95']} p99={lat['p99']} o'rtacha={lat['mean']}")
+    print(f"Backend so'rovlari: {report['backend_calls']} ({report['backend_calls_per_journey']} / sayohat)")
+    print(f"Telegram so'rovlari: {report['telegram_calls']} ({report['telegram_calls_per_journey']} / sayohat)")
+    print(f"Yaratilgan buyurtmalar: {report['orders_created']}")
+    print()
+    print(f"{'qadam':<14}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, stats in report["steps_ms"].items():
+        print(f"{name:<14}{stats['p50']:>10}{stats['p95']:>10}{stats['p99']:>10}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="EshopBot yuklama testi (soxta Telegram va backend bilan)")
+    parser.add_argument("--journeys", type=int, default=100, help="virtual foydalanuvchilar soni")
+    parser.add_argument("--concurrency", type=int, default=10, help="bir vaqtda ishlovchi sayohatlar")
+    parser.add_argument("--categories", type=int, default=10, help="katalogdagi kategoriyalar soni")
+    parser.add_argument("--products", type=int, default=200, help="katalogdagi mahsulotlar soni")
+    parser.add_argument("--backend-latency", type=float, default=0.0, help="backend javob kechikishi, ms")
+    parser.add_argument("--telegram-latency", type=float, default=0.0, help="Telegram API javob kechikishi, ms")
+    parser.add_argument("--log-level", default="ERROR", help="bot loglari darajasi")
+    parser.add_argument("--json", dest="json_path", help="natijani JSON faylga yozish")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
@@ -0,0 +1 @@
+# Testlar ildiz papkadagi modullarni (main, json_codec, ...) import qila olishi uchun
@@ -0,0 +1,122 @@
+"""
+Backend javoblari va Bot sessiyasi uchun JSON kodek.
+
+`orjson` o'rnatilgan bo'lsa undan, aks holda standart `json`dan foydalaniladi.
+JSON_CODEC=json orqali standart kodekni majburan tanlash mumkin.
+
+`iter_json_array` ro'yxat javoblarini elementma-element qaytaradi. Kichik tanalar
+(JSON_STREAM_THRESHOLD baytgacha) tanlangan kodek bilan bir martada decode qilinadi -
+bu CPU bo'yicha eng tezi. Kattaroq yoki uzunligi noma'lum tanalar butun tanani
+xotiraga yig'masdan oqim sifatida o'qiladi (standart `json` C skaneri bilan).
+"""
+import codecs
+import json
+import os
+import re
+
+JSON_CODEC = os.getenv("JSON_CODEC", "orjson").lower()
+JSON_STREAM_THRESHOLD = int(os.getenv("JSON_STREAM_THRESHOLD", str(4 * 1024 * 1024)))
+
+try:
+    if JSON_CODEC != "orjson":
+        raise ImportError
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    json_loads = orjson.loads
+
+    def json_dumps(obj):
+        return orjson.dumps(obj).decode()
+else:
+    json_loads = json.loads
+    json_dumps = json.dumps
+
+
+async def read_json(response):
+    """Javob tanasini bir marta o'qib, to'g'ridan-to'g'ri baytlardan decode qilish"""
+    return json_loads(await response.read())
+
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+async def iter_json_array(response, chunk_size=64 * 1024, stream_threshold=None):
+    """Yuqori darajadagi JSON massiv elementlarini qaytarish; noto'g'ri JSON'da ValueError"""
+    if stream_threshold is None:
+        stream_threshold = JSON_STREAM_THRESHOLD
+    length = response.content_length
+    if length is not None and length <= stream_threshold:
+        items = json_loads(await response.read())
+        if not isinstance(items, list):
+            raise ValueError("JSON massiv kutilgan edi")
+        for item in items:
+            yield item
+        return
+
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    eof = False
+    # "[" -> qiymat yoki "]" -> "," yoki "]" -> qiymat ... -> faqat bo'sh joy
+    expect = "open"
+
+    while True:
+        # Buferdagi to'liq elementlarni ajratib olish
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+            if expect == "open":
+                if char != "[":
+                    raise ValueError("JSON massiv kutilgan edi")
+                expect = "value_or_close"
+                pos += 1
+                continue
+            if expect == "end":
+                raise ValueError("JSON massivdan keyin ortiqcha ma'lumot")
+            if expect == "separator":
+                if char == ",":
+                    expect = "value"
+                elif char == "]":
+                    expect = "end"
+                else:
+                    raise ValueError(f"JSON massivda ',' yoki ']' kutilgan edi: {char!r}")
+                pos += 1
+                continue
+            if char == "]" and expect == "value_or_close":
+                expect = "end"
+                pos += 1
+                continue
+            if char in ",]":
+                raise ValueError(f"JSON massivda qiymat kutilgan edi: {char!r}")
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Element hali to'liq kelmagan bo'lishi mumkin
+                if eof:
+                    raise
+                break
+            # Skalyar (masalan, "-1" dan keyin ".5e-7") ajratuvchisiz tugasa, davomi kelishi mumkin
+            if not eof and not isinstance(item, (dict, list)):
+                after = _WHITESPACE.match(buffer, end).end()
+                if after == len(buffer) or buffer[after] not in ",]":
+                    break
+            pos = end
+            expect = "separator"
+            yield item
+
+        if eof:
+            if expect != "end":
+                raise ValueError("JSON massiv yakunlanmagan")
+            return
+        chunk = await response.content.read(chunk_size)
+        if not chunk:
+            eof = True
+            buffer = buffer[pos:] + utf8.decode(b"", final=True)
+        else:
+            buffer = buffer[pos:] + utf8.decode(chunk)
+        pos = 0
@@ -0,0 +1,179 @@
+"""
+Bot uchun bloklanmaydigan logging.
+
+Yozuvlar event loop'da faqat navbatga (queue) qo'yiladi: xabar shabloni o'zgarishsiz
+qoladi, faqat o'zgaruvchan argumentlar matnga aylantirib olinadi. Xabarni formatlash,
+traceback, JSON'ga aylantirish va stderr'ga yozish fon oqimidagi QueueListener'da bajariladi.
+
+Muhit o'zgaruvchilari:
+    LOG_LEVEL        - log darajasi (standart: INFO)
+    LOG_FORMAT       - "json" yoki "text" (standart: json)
+    LOG_MAX_PAYLOAD  - payload uchun maksimal belgilar soni (standart: 500)
+    LOG_SAMPLE_RATE  - ko'p takrorlanadigan yozuvlarning qancha qismi yoziladi, 0..1 (standart: 0.1)
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import numbers
+import os
+import queue
+import random
+import reprlib
+from collections.abc import Mapping
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_MAX_PAYLOAD = int(os.getenv("LOG_MAX_PAYLOAD", "500"))
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+
+# Ko'p takrorlanadigan yozuvlar uchun: logging.info(..., extra=SAMPLED)
+SAMPLED = {"sampled": True}
+# Bu logger'larning WARNING'dan past yozuvlari ham SAMPLED kabi tanlab yoziladi
+# (aiogram.event har bir update uchun "Update id=... is handled" yozadi)
+SAMPLED_LOGGERS = ("aiogram.event",)
+
+current_user_id = contextvars.ContextVar("current_user_id", default=None)
+current_update_id = contextvars.ContextVar("current_update_id", default=None)
+
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_repr = reprlib.Repr()
+_repr.maxlevel = 3
+_repr.maxdict = 10
+_repr.maxlist = 10
+_repr.maxstring = 80
+_repr.maxother = 80
+
+
+class truncate:
+    """Payload'ni faqat yozuv haqiqatan formatlanganda qisqartirilgan holda ko'rsatish"""
+
+    __slots__ = ("payload", "limit")
+
+    def __init__(self, payload, limit=None):
+        self.payload = payload
+        self.limit = LOG_MAX_PAYLOAD if limit is None else limit
+
+    def __str__(self):
+        text = self.payload if isinstance(self.payload, str) else _repr.repr(self.payload)
+        if len(text) > self.limit:
+            return f"{text[:self.limit]}...(+{len(text) - self.limit})"
+        return text
+
+    __repr__ = __str__
+
+
+class ContextFilter(logging.Filter):
+    """Yozuvga joriy update va foydalanuvchi ID'larini qo'shish (event loop oqimida ishlaydi)"""
+
+    def filter(self, record):
+        if not hasattr(record, "user_id"):
+            record.user_id = current_user_id.get()
+        if not hasattr(record, "update_id"):
+            record.update_id = current_update_id.get()
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """SAMPLED bilan belgilangan va `loggers`dagi yozuvlarning faqat bir qismini o'tkazish"""
+
+    def __init__(self, rate, loggers=()):
+        super().__init__()
+        self.rate = rate
+        self.loggers = frozenset(loggers)
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        if getattr(record, "sampled", False) or record.name in self.loggers:
+            return random.random() < self.rate
+        return True
+
+
+def _snapshot(arg):
+    # Sonlar va satrlar o'zgarmas; qolganlari (list, istisno, truncate, ...) yozuv
+    # fon oqimida formatlanguncha o'zgarib qolmasligi uchun hozir qisqartirilgan matnga
+    # aylantiriladi - aiogram'ning o'z yozuvlaridagi argumentlar ham shu yo'l bilan cheklanadi
+    if arg is None or isinstance(arg, (str, bytes, numbers.Number)):
+        return arg
+    return str(truncate(str(arg)))
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Standart QueueHandler.prepare xabarni event loop'da formatlab, exc_info'ni o'chiradi.
+
+    Bu yerda yozuv formatlanmasdan navbatga qo'yiladi: msg/args va exc_info
+    saqlanadi, formatlash esa QueueListener'dagi handler'ga qoldiriladi.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        if isinstance(record.args, Mapping):
+            # Yagona lug'at argumenti ("%s" yoki "%(key)s" uchun) bir butun sifatida
+            # saqlanishi kerak, shuning uchun bu kamdan-kam holatda xabar shu yerda formatlanadi
+            record.msg = record.getMessage()
+            record.args = None
+        elif record.args:
+            record.args = tuple(_snapshot(arg) for arg in record.args)
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Har bir yozuvni bitta JSON qator sifatida chiqarish"""
+
+    def format(self, record):
+        data = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and key != "sampled" and value is not None:
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def setup_logging():
+    """Root logger'ni DeferredQueueHandler + fon QueueListener bilan sozlash"""
+    if LOG_FORMAT == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(SampleFilter(LOG_SAMPLE_RATE, SAMPLED_LOGGERS))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    # Jarayon tugashida navbatdagi yozuvlar yo'qolmasin
+    atexit.register(listener.stop)
+    return listener
+
+
+async def log_context_middleware(handler, event, data):
+    """Update uchun user_id/update_id'ni contextvars orqali loglarga uzatish"""
+    user = data.get("event_from_user")
+    user_token = current_user_id.set(user.id if user else None)
+    update_token = current_update_id.set(event.update_id)
+    try:
+        return await handler(event, data)
+    finally:
+        current_user_id.reset(user_token)
+        current_update_id.reset(update_token)
@@ -1,3 +1,6 @@
+import time
+STARTED_AT = time.perf_counter()  # sovuq ishga tushish vaqtini o'lchash uchun
+
 import asyncio
 import logging
 import html
@@ -12,11 +15,18 @@ from aiogram.types import (
     LabeledPrice, PreCheckoutQuery
 )
 from aiogram.client.default import DefaultBotProperties
-from aiogram.filters import Command
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
 
+from json_codec import iter_json_array, json_dumps, json_loads, read_json
+from logging_setup import SAMPLED, log_context_middleware, setup_logging, truncate
+from notifications import ORDER_STATUS_LABELS, OrderStatusNotifier
+from rendering import category_keyboard, product_caption, quantity_keyboard
+from snapshot import StateSnapshot
+
 # Holatlar sinfi
 class OrderStates(StatesGroup):
     WAITING_FOR_ADDRESS = State()
@@ -33,31 +43,59 @@ PRODUCTS_ENDPOINT = os.getenv("PRODUCTS_ENDPOINT", "/api/products/products/")
 ORDER_GROUPS_ENDPOINT = os.getenv("ORDER_GROUPS_ENDPOINT", "/api/orders/order-groups/")
 ORDERS_ENDPOINT = os.getenv("ORDERS_ENDPOINT", "/api/orders/orders/")
 PAYMENT_PROVIDER_TOKEN = os.getenv("PAYMENT_PROVIDER_TOKEN", "398062629:TEST:999999999_F91D8F69C042267444B74CC0B3C747757EB0E065")
-
-# Logging sozlamalari
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "state.snapshot")
+SNAPSHOT_LAZY_BYTES = int(os.getenv("SNAPSHOT_LAZY_BYTES", str(1024 * 1024)))
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "20"))
+NOTIFY_MODE = os.getenv("NOTIFY_MODE", "off").lower()  # off | http | poll
+NOTIFY_STATE_PATH = os.getenv("NOTIFY_STATE_PATH", "notifications.json")
+NOTIFY_RATE = float(os.getenv("NOTIFY_RATE", "25"))
+NOTIFY_BATCH_INTERVAL = float(os.getenv("NOTIFY_BATCH_INTERVAL", "1"))
+NOTIFY_SAVE_INTERVAL = float(os.getenv("NOTIFY_SAVE_INTERVAL", "5"))
+NOTIFY_POLL_INTERVAL = float(os.getenv("NOTIFY_POLL_INTERVAL", "30"))
+NOTIFY_CURSOR_PARAM = os.getenv("NOTIFY_CURSOR_PARAM", "updated_since")
+NOTIFY_HTTP_HOST = os.getenv("NOTIFY_HTTP_HOST", "127.0.0.1")
+NOTIFY_HTTP_PORT = int(os.getenv("NOTIFY_HTTP_PORT", "8080"))
+NOTIFY_HTTP_PATH = os.getenv("NOTIFY_HTTP_PATH", "/notifications/order-status")
+NOTIFY_SECRET = os.getenv("NOTIFY_SECRET")
+
+# Logging sozlamalari (navbat orqali, fon oqimida yoziladi)
+log_listener = setup_logging()
 
 # Bot va Dispatcher'ni ishga tushirish
 bot = Bot(
     token=API_TOKEN,
+    session=AiohttpSession(json_loads=json_loads, json_dumps=json_dumps),
     default=DefaultBotProperties(parse_mode=ParseMode.HTML))
 dp = Dispatcher(storage=MemoryStorage())
+dp.update.outer_middleware(log_context_middleware)
 
 # 🛒 Foydalanuvchi ma'lumotlari uchun saqlash
 user_selected_product = {}
 user_cart = {}
 user_delivery_address = {}
 
+# 💾 Qayta ishga tushganda holat yo'qolmasligi uchun snapshot
+snapshot = StateSnapshot(
+    SNAPSHOT_PATH,
+    {"selected": user_selected_product, "cart": user_cart, "address": user_delivery_address},
+    dp.storage,
+    lazy_threshold=SNAPSHOT_LAZY_BYTES,
+)
+dp.update.outer_middleware(snapshot.middleware)
+
+# 🔔 Buyurtma holati bildirishnomalari
+notifier = OrderStatusNotifier(
+    NOTIFY_STATE_PATH, rate=NOTIFY_RATE,
+    batch_interval=NOTIFY_BATCH_INTERVAL, save_interval=NOTIFY_SAVE_INTERVAL
+)
+
 def ensure_numeric_price(product_data):
     """Mahsulot narxini raqamli (float) formatga o'tkazish"""
     if isinstance(product_data.get('price'), str):
         try:
             product_data['price'] = float(product_data['price'])
         except (ValueError, TypeError):
-            logging.warning(f"Mahsulot uchun noto'g'ri narx formati: {product_data.get('name', 'Nomalum')}")
+            logging.warning("Mahsulot uchun noto'g'ri narx formati: %s", product_data.get('name', 'Nomalum'))
             product_data['price'] = 0.0
     return product_data
 
@@ -76,7 +114,7 @@ async def start_handler(message: types.Message):
 async def contact_handler(message: types.Message):
     chat_id = str(message.chat.id)
     contact = message.contact
-    logging.info(f"Kontakt qayta ishlanmoqda: chat_id={chat_id}, telefon={contact.phone_number}")
+    logging.info("Kontakt qayta ishlanmoqda: chat_id=%s, telefon=%s", chat_id, contact.phone_number)
 
     photos = await bot.get_user_profile_photos(user_id=message.from_user.id, limit=1)
     photo_url = None
@@ -97,22 +135,22 @@ async def contact_handler(message: types.Message):
 
     await message.answer("⏳ Ma'lumotlaringiz yuborilmoqda...")
 
-    async with aiohttp.ClientSession() as session:
+    async with aiohttp.ClientSession(json_serialize=json_dumps) as session:
         try:
             check_url = f"{BASE_API_URL.rstrip('/')}{USERS_ENDPOINT.rstrip('/')}?chat_id={chat_id}"
-            logging.info(f"Foydalanuvchi tekshirilmoqda: {check_url}")
+            logging.info("Foydalanuvchi tekshirilmoqda: %s", check_url, extra=SAMPLED)
             async with session.get(check_url) as check_response:
-                response_text = await check_response.text()
                 if check_response.status == 200:
-                    existing_users = await check_response.json()
+                    existing_users = await read_json(check_response)
                     if existing_users:
-                        logging.info(f"Foydalanuvchi topildi: chat_id={chat_id}, bot_user_id={existing_users[0]['id']}")
+                        logging.info("Foydalanuvchi topildi: chat_id=%s, bot_user_id=%s", chat_id, existing_users[0]['id'])
                         await send_categories(message)
                         return
                     else:
-                        logging.info(f"Foydalanuvchi topilmadi: chat_id={chat_id}, yangi foydalanuvchi yaratilmoqda")
+                        logging.info("Foydalanuvchi topilmadi: chat_id=%s, yangi foydalanuvchi yaratilmoqda", chat_id)
                 else:
-                    logging.error(f"Foydalanuvchi tekshirishda xato, status: {check_response.status}, javob: {response_text[:100]}...")
+                    response_text = await check_response.text()
+                    logging.error("Foydalanuvchi tekshirishda xato, status: %s, javob: %s", check_response.status, truncate(response_text, 100))
                     await message.answer(
                         f"❌ Foydalanuvchi tekshirishda xatolik, status kodi: {check_response.status}\n"
                         f"Iltimos, /start buyrug'ini qayta yuboring yoki administrator bilan bog'laning."
@@ -120,21 +158,21 @@ async def contact_handler(message: types.Message):
                     return
 
             post_url = f"{BASE_API_URL.rstrip('/')}{USERS_ENDPOINT.rstrip('/')}/"
-            logging.info(f"Yangi foydalanuvchi yaratilmoqda: {post_url}")
+            logging.info("Yangi foydalanuvchi yaratilmoqda: %s", post_url)
             async with session.post(post_url, json=user_data) as response:
-                response_text = await response.text()
                 if response.status in (200, 201):
-                    logging.info(f"Foydalanuvchi muvaffaqiyatli yaratildi: chat_id={chat_id}")
+                    logging.info("Foydalanuvchi muvaffaqiyatli yaratildi: chat_id=%s", chat_id)
                     await message.answer("✅ Ro'yxatdan muvaffaqiyatli o'tdingiz!")
                     await send_categories(message)
                 else:
-                    logging.error(f"Foydalanuvchi yaratishda xato, status: {response.status}, javob: {response_text[:100]}...")
+                    response_text = await response.text()
+                    logging.error("Foydalanuvchi yaratishda xato, status: %s, javob: %s", response.status, truncate(response_text, 100))
                     await message.answer(
                         f"❌ Ro'yxatdan o'tishda xatolik, status kodi: {response.status}\n"
                         f"Iltimos, /start buyrug'ini qayta yuboring yoki administrator bilan bog'laning."
                     )
-        except aiohttp.ClientError as e:
-            logging.error(f"Foydalanuvchi ro'yxatdan o'tkazishda xato: {e}")
+        except (aiohttp.ClientError, ValueError) as e:
+            logging.error("Foydalanuvchi ro'yxatdan o'tkazishda xato: %s", e)
             await message.answer(
                 f"⚠️ Server bilan aloqa xatosi:\n<code>{html.escape(str(e))}</code>\n"
                 f"Iltimos, serveringiz ishlayotganligini tekshiring."
@@ -143,53 +181,38 @@ async def contact_handler(message: types.Message):
 # 📦 Kategoriyalarni yuborish
 async def send_categories(message: types.Message):
     url = f"{BASE_API_URL.rstrip('/')}{CATEGORIES_ENDPOINT.rstrip('/')}/"
-    async with aiohttp.ClientSession() as session:
+    async with aiohttp.ClientSession(json_serialize=json_dumps) as session:
         try:
             async with session.get(url) as response:
                 if response.status == 200:
-                    categories = await response.json()
+                    categories = await read_json(response)
                     if not categories:
                         await message.answer("📭 Hech qanday kategoriya topilmadi.")
                         return
 
-                    buttons = []
-                    row = []
-                    for cat in categories:
-                        row.append(KeyboardButton(text=cat["name"]))
-                        if len(row) == 2:
-                            buttons.append(row)
-                            row = []
-                    if row:
-                        buttons.append(row)
-                    buttons.append([KeyboardButton(text="🛍 Savatchani ko'rish"), KeyboardButton(text="📜 Buyurtmalarim")])
-
-                    keyboard = ReplyKeyboardMarkup(keyboard=buttons, resize_keyboard=True)
-                    await message.answer("📦 Kategoriya tanlang:", reply_markup=keyboard)
+                    await message.answer("📦 Kategoriya tanlang:", reply_markup=category_keyboard(categories))
                 else:
-                    logging.error(f"Kategoriyalarni olishda xato, status: {response.status}")
+                    logging.error("Kategoriyalarni olishda xato, status: %s", response.status)
                     await message.answer("❌ Kategoriyalarni olishda xatolik.")
-        except aiohttp.ClientError as e:
-            logging.error(f"Kategoriyalarni olishda xato: {e}")
+        except (aiohttp.ClientError, ValueError) as e:
+            logging.error("Kategoriyalarni olishda xato: %s", e)
             await message.answer(f"⚠️ Xatolik:\n<code>{html.escape(str(e))}</code>")
 
 # 📂 Kategoriya tanlash
-@dp.message(lambda message: message.text and message.text not in ["🛍 Savatchani ko'rish", "📜 Buyurtmalarim"])
-async def category_selected_handler(message: types.Message, state: FSMContext):
-    current_state = await state.get_state()
-    if current_state is not None:
-        return
-
+# StateFilter(None): holat o'rnatilgan bo'lsa (masalan, manzil kutilmoqda) xabar keyingi handlerga o'tadi
+@dp.message(StateFilter(None), lambda message: message.text and message.text not in ["🛍 Savatchani ko'rish", "📜 Buyurtmalarim"])
+async def category_selected_handler(message: types.Message):
     if not message.text:
         await message.answer("🚫 Iltimos, matnli xabar yuboring (masalan, kategoriya nomini).")
         return
 
     category_name = message.text.strip()
 
-    async with aiohttp.ClientSession() as session:
+    async with aiohttp.ClientSession(json_serialize=json_dumps) as session:
         try:
             cat_url = f"{BASE_API_URL.rstrip('/')}{CATEGORIES_ENDPOINT.rstrip('/')}/"
             async with session.get(cat_url) as cat_resp:
-                categories = await cat_resp.json()
+                categories = await read_json(cat_resp)
                 matched = next((c for c in categories if c["name"].lower() == category_name.lower()), None)
 
                 if not matched:
@@ -198,8 +221,9 @@ async def category_selected_handler(message: types.Message, state: FSMContext):
 
                 prod_url = f"{BASE_API_URL.rstrip('/')}{PRODUCTS_ENDPOINT.rstrip('/')}/"
                 async with session.get(prod_url) as prod_resp:
-                    products = await prod_resp.json()
-                    filtered = [p for p in products if p["category_name"].lower() == matched["name"].lower()]
+                    # Ro'yxat oqim sifatida o'qiladi: faqat shu kategoriya mahsulotlari xotirada qoladi
+                    matched_name = matched["name"].lower()
+                    filtered = [p async for p in iter_json_array(prod_resp) if p["category_name"].lower() == matched_name]
 
                     if not filtered:
                         await message.answer("📭 Bu kategoriyada mahsulotlar yo'q.")
@@ -211,8 +235,8 @@ async def category_selected_handler(message: types.Message, state: FSMContext):
                     ]
                     markup = InlineKeyboardMarkup(inline_keyboard=buttons)
                     await message.answer("🛍 Mahsulotlar:", reply_markup=markup)
-        except aiohttp.ClientError as e:
-            logging.error(f"Mahsulotlarni olishda xato: {e}")
+        except (aiohttp.ClientError, ValueError) as e:
+            logging.error("Mahsulotlarni olishda xato: %s", e)
             await message.answer(f"⚠️ Xatolik:\n<code>{html.escape(str(e))}</code>")
 
 # ✅ Mahsulot tanlash
@@ -222,46 +246,30 @@ async def product_selected_callback(callback: types.CallbackQuery):
     user_id = str(callback.from_user.id)
     await callback.answer()
 
-    async with aiohttp.ClientSession() as session:
+    async with aiohttp.ClientSession(json_serialize=json_dumps) as session:
         url = f"{BASE_API_URL.rstrip('/')}{PRODUCTS_ENDPOINT.rstrip('/')}/{product_id}/"
         try:
             async with session.get(url) as response:
                 if response.status == 200:
-                    product = await response.json()
+                    product = await read_json(response)
                     product = ensure_numeric_price(product)
                     user_selected_product[user_id] = {"product": product, "quantity": 1}
 
-                    caption = (
-                        f"<b>📦 {product['name']}</b>\n"
-                        f"💰 Narxi: <b>{product['price']}</b> so'm\n"
-                        f"🗂 Kategoriya: {product['category_name']}\n"
-                        f"🧮 Zaxira: {product['stock']} dona\n\n"
-                        f"<i>{product['description'] or 'ℹ️ Tavsif mavjud emas'}</i>"
-                    )
-
-                    keyboard = InlineKeyboardMarkup(
-                        inline_keyboard=[
-                            [
-                                InlineKeyboardButton(text="➖", callback_data="qty_decrease"),
-                                InlineKeyboardButton(text="1 ta", callback_data="noop"),
-                                InlineKeyboardButton(text="➕", callback_data="qty_increase")
-                            ],
-                            [InlineKeyboardButton(text="🛒 Savatchaga qo'shish", callback_data="add_to_cart")]
-                        ]
-                    )
+                    caption = product_caption(product)
+                    keyboard = quantity_keyboard(1)
 
                     fallback_image = "https://upload.wikimedia.org/wikipedia/commons/d/d1/Image_not_available.png"
                     image_url = product.get("image")
                     if not image_url or image_url.startswith(f"{BASE_API_URL}/"):
-                        logging.warning(f"Mahsulot uchun standart rasm ishlatilmoqda: {product_id}, image_url: {image_url}")
+                        logging.warning("Mahsulot uchun standart rasm ishlatilmoqda: %s, image_url: %s", product_id, image_url)
                         await callback.message.answer_photo(photo=fallback_image, caption=caption, reply_markup=keyboard)
                     else:
                         await callback.message.answer_photo(photo=image_url, caption=caption, reply_markup=keyboard)
                 else:
-                    logging.error(f"Mahsulotni olishda xato: {product_id}, status: {response.status}")
+                    logging.error("Mahsulotni olishda xato: %s, status: %s", product_id, response.status)
                     await callback.message.answer("❌ Mahsulotni olishda xatolik.")
-        except aiohttp.ClientError as e:
-            logging.error(f"Mahsulotni olishda xato: {product_id}: {e}")
+        except (aiohttp.ClientError, ValueError) as e:
+            logging.error("Mahsulotni olishda xato: %s: %s", product_id, e)
             await callback.message.answer(f"⚠️ Xatolik:\n<code>{html.escape(str(e))}</code>")
 
 # 🔢 Miqdor yangilash
@@ -283,29 +291,10 @@ async def update_quantity_callback(callback: types.CallbackQuery):
     item["quantity"] = qty
     product = item["product"]
 
-    caption = (
-        f"<b>📦 {product['name']}</b>\n"
-        f"💰 Narxi: <b>{product['price']}</b> so'm\n"
-        f"🗂 Kategoriya: {product['category_name']}\n"
-        f"🧮 Zaxira: {product['stock']} dona\n\n"
-        f"<i>{product['description'] or 'ℹ️ Tavsif mavjud emas'}</i>"
-    )
-
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="➖", callback_data="qty_decrease"),
-                InlineKeyboardButton(text=f"{qty} ta", callback_data="noop"),
-                InlineKeyboardButton(text="➕", callback_data="qty_increase")
-            ],
-            [InlineKeyboardButton(text="🛒 Savatchaga qo'shish", callback_data="add_to_cart")]
-        ]
-    )
-
     try:
-        await callback.message.edit_caption(caption=caption, reply_markup=keyboard)
+        await callback.message.edit_caption(caption=product_caption(product), reply_markup=quantity_keyboard(qty))
     except Exception as e:
-        logging.warning(f"Tahrir qilishda xato: {e}")
+        logging.warning("Tahrir qilishda xato: %s", e)
         pass
     await callback.answer()
 
@@ -401,7 +390,7 @@ async def remove_from_cart_callback(callback: types.CallbackQuery):
             try:
                 await show_cart_after_edit(callback.message)
             except Exception as e:
-                logging.error(f"Savatchani yangilashda xato: {e}")
+                logging.error("Savatchani yangilashda xato: %s", e)
                 await callback.message.answer(f"⚠️ Xatolik yuz berdi: {html.escape(str(e))}")
     else:
         await callback.answer("❌ Mahsulot topilmadi.", show_alert=True)
@@ -449,7 +438,7 @@ async def show_cart_after_edit(message: types.Message):
     try:
         await message.edit_text(text, reply_markup=keyboard)
     except Exception as e:
-        logging.error(f"Savatcha xabarini tahrir qilishda xato: {e}")
+        logging.error("Savatcha xabarini tahrir qilishda xato: %s", e)
         await message.answer(text, reply_markup=keyboard)
 
 # 🔄 Savatchani tozalash
@@ -502,14 +491,14 @@ async def delivery_address_handler(message: types.Message, state: FSMContext):
         return
 
     user_delivery_address[user_id] = delivery_address
-    logging.info(f"Manzil saqlandi: user_id={user_id}, manzil={delivery_address}")
+    logging.info("Manzil saqlandi: user_id=%s, manzil=%s", user_id, delivery_address)
 
     try:
         await message.answer(f"✅ Manzil saqlandi: {delivery_address}! Endi to'lovga o'tamiz...")
         await state.clear()
         await initiate_payment(message)
     except Exception as e:
-        logging.error(f"To'lovni boshlashda xato: {e}")
+        logging.error("To'lovni boshlashda xato: %s", e)
         await message.answer(f"❌ To'lovni boshlashda xatolik yuz berdi: {html.escape(str(e))}. Iltimos, qayta urinib ko'ring.")
         await state.clear()
 
@@ -518,11 +507,11 @@ async def initiate_payment(message: types.Message):
     user_id = str(message.from_user.id)
     cart = user_cart.get(user_id)
     if not cart:
-        logging.error(f"Savatcha bo'sh: user_id={user_id}")
+        logging.error("Savatcha bo'sh: user_id=%s", user_id)
         await message.answer("🧺 Savatchangiz bo'sh.")
         return
 
-    logging.info(f"To'lov jarayoni boshlanmoqda: user_id={user_id}, savatcha elementlari={len(cart)}")
+    logging.info("To'lov jarayoni boshlanmoqda: user_id=%s, savatcha elementlari=%s", user_id, len(cart))
 
     prices = []
     total_price = 0.0
@@ -533,7 +522,7 @@ async def initiate_payment(message: types.Message):
         price = float(product["price"]) if isinstance(product["price"], str) else product["price"]
 
         if price <= 0:
-            logging.error(f"Noto'g'ri narx: product_id={product_id}, price={price}")
+            logging.error("Noto'g'ri narx: product_id=%s, price=%s", product_id, price)
             await message.answer(f"❌ Mahsulot '{product['name']}' narxi noto'g'ri ({price} so'm). Iltimos, administrator bilan bog'laning.")
             return
 
@@ -543,11 +532,11 @@ async def initiate_payment(message: types.Message):
         description.append(f"{product['name']} - {qty} ta x {price:.2f} so'm")
 
     if total_price <= 0:
-        logging.error(f"Umumiy narx noto'g'ri: total_price={total_price}, user_id={user_id}")
+        logging.error("Umumiy narx noto'g'ri: total_price=%s, user_id=%s", total_price, user_id)
         await message.answer("❌ Buyurtma narxi noto'g'ri. Iltimos, savatchangizni tekshiring.")
         return
 
-    logging.info(f"To'lov ma'lumotlari: user_id={user_id}, total_price={total_price:.2f}, items={description}")
+    logging.info("To'lov ma'lumotlari: user_id=%s, total_price=%.2f, items=%s", user_id, total_price, truncate(description), extra=SAMPLED)
 
     try:
         await bot.send_invoice(
@@ -559,9 +548,9 @@ async def initiate_payment(message: types.Message):
             currency="UZS",
             prices=prices
         )
-        logging.info(f"Hisob-faktura yuborildi: user_id={user_id}")
+        logging.info("Hisob-faktura yuborildi: user_id=%s", user_id)
     except Exception as e:
-        logging.error(f"Hisob-faktura yuborishda xato: {str(e)}")
+        logging.error("Hisob-faktura yuborishda xato: %s", e)
         await message.answer(
             f"❌ To'lovni boshlashda xatolik yuz berdi:\n"
             f"<code>{html.escape(str(e))}</code>\n"
@@ -581,36 +570,36 @@ async def successful_payment_handler(message: types.Message):
     delivery_address = user_delivery_address.get(user_id)
 
     if not cart or not delivery_address:
-        logging.error(f"Buyurtma yoki manzil topilmadi: user_id={user_id}, cart={cart}, delivery_address={delivery_address}")
+        logging.error("Buyurtma yoki manzil topilmadi: user_id=%s, cart=%s, delivery_address=%s", user_id, truncate(cart), delivery_address)
         await message.answer("❌ Buyurtma yoki manzil topilmadi. Iltimos, qayta urinib ko'ring.")
         return
 
     total_amount = message.successful_payment.total_amount / 100
     order_id = message.successful_payment.invoice_payload
-    logging.info(f"To'lov muvaffaqiyatli: user_id={user_id}, order_id={order_id}, total_amount={total_amount}, manzil={delivery_address}")
+    logging.info("To'lov muvaffaqiyatli: user_id=%s, order_id=%s, total_amount=%s, manzil=%s", user_id, order_id, total_amount, delivery_address)
 
-    async with aiohttp.ClientSession() as session:
+    async with aiohttp.ClientSession(json_serialize=json_dumps) as session:
         try:
             # Foydalanuvchi tekshiruvi
             user_url = f"{BASE_API_URL.rstrip('/')}{USERS_ENDPOINT.rstrip('/')}?chat_id={user_id}"
-            logging.info(f"Foydalanuvchi tekshirilmoqda: {user_url}")
+            logging.info("Foydalanuvchi tekshirilmoqda: %s", user_url, extra=SAMPLED)
             async with session.get(user_url) as resp:
-                response_text = await resp.text()
                 if resp.status != 200:
-                    logging.error(f"BotUser'ni olishda xato, status: {resp.status}, javob: {response_text}")
+                    response_text = await resp.text()
+                    logging.error("BotUser'ni olishda xato, status: %s, javob: %s", resp.status, truncate(response_text))
                     await message.answer(
                         f"❌ Server xatosi: Foydalanuvchi topilmadi, status kodi: {resp.status}."
                     )
                     return
-                data = await resp.json()
+                data = await read_json(resp)
                 if not data or len(data) != 1:
-                    logging.error(f"Chat_id uchun noto'g'ri BotUser ma'lumotlari: {user_id}: {data}")
+                    logging.error("Chat_id uchun noto'g'ri BotUser ma'lumotlari: %s: %s", user_id, truncate(data))
                     await message.answer(
                         "❌ Ro'yxatdan o'tmagansiz yoki foydalanuvchi ma'lumotlari xato."
                     )
                     return
                 bot_user_id = data[0]["id"]
-                logging.info(f"Bot_user_id olindi: {bot_user_id}, chat_id: {user_id}")
+                logging.info("Bot_user_id olindi: %s, chat_id: %s", bot_user_id, user_id)
 
             # OrderGroup yaratish
             order_group_data = {
@@ -621,23 +610,23 @@ async def successful_payment_handler(message: types.Message):
                 "total_price": float(total_amount)
             }
             order_group_url = f"{BASE_API_URL.rstrip('/')}{ORDER_GROUPS_ENDPOINT.rstrip('/')}/"
-            logging.info(f"OrderGroup yaratilmoqda: {order_group_url}, ma'lumotlar: {order_group_data}")
+            logging.info("OrderGroup yaratilmoqda: %s, ma'lumotlar: %s", order_group_url, truncate(order_group_data), extra=SAMPLED)
             async with session.post(order_group_url, json=order_group_data) as response:
-                response_text = await response.text()
                 if response.status != 201:
-                    logging.error(f"OrderGroup yaratishda xato, status: {response.status}, javob: {response_text}")
+                    response_text = await response.text()
+                    logging.error("OrderGroup yaratishda xato, status: %s, javob: %s", response.status, truncate(response_text))
                     await message.answer(
                         f"❌ Buyurtma guruhini yaratishda xatolik, status kodi: {response.status}\n"
                         f"Javob: {response_text[:200]}\n"
                         f"Iltimos, administrator bilan bog'laning."
                     )
                     return
-                order_group = await response.json()
+                order_group = await read_json(response)
                 order_group_id = order_group["id"]
                 saved_address = order_group.get("delivery_address", "Manzil topilmadi")
-                logging.info(f"OrderGroup yaratildi: ID={order_group_id}, bot_user_id={bot_user_id}, manzil={saved_address}")
+                logging.info("OrderGroup yaratildi: ID=%s, bot_user_id=%s, manzil=%s", order_group_id, bot_user_id, saved_address)
                 if saved_address != delivery_address:
-                    logging.warning(f"Manzil saqlanmadi: kutilgan={delivery_address}, saqlangan={saved_address}")
+                    logging.warning("Manzil saqlanmadi: kutilgan=%s, saqlangan=%s", delivery_address, saved_address)
 
             # Orderlarni yaratish
             success = True
@@ -648,12 +637,12 @@ async def successful_payment_handler(message: types.Message):
                     "quantity": max(1, item["quantity"]),
                     "subtotal": float(item["quantity"] * item["product"]["price"])
                 }
-                logging.info(f"Order yaratilmoqda: product_id={product_id}, order_data={order_data}")
+                logging.info("Order yaratilmoqda: product_id=%s, order_data=%s", product_id, truncate(order_data), extra=SAMPLED)
                 try:
                     async with session.post(f"{BASE_API_URL.rstrip('/')}{ORDERS_ENDPOINT.rstrip('/')}/", json=order_data) as response:
-                        response_text = await response.text()
                         if response.status != 201:
-                            logging.error(f"Mahsulot uchun buyurtma yaratishda xato: {product_id}, status: {response.status}, javob: {response_text}")
+                            response_text = await response.text()
+                            logging.error("Mahsulot uchun buyurtma yaratishda xato: %s, status: %s, javob: %s", product_id, response.status, truncate(response_text))
                             success = False
                             await message.answer(
                                 f"❌ Buyurtma qo'shishda xatolik, mahsulot ID: {product_id}, status kodi: {response.status}\n"
@@ -661,10 +650,10 @@ async def successful_payment_handler(message: types.Message):
                                 f"Iltimos, administrator bilan bog'laning."
                             )
                             break
-                        order_response = await response.json()
-                        logging.info(f"Buyurtma yaratildi: product_id={product_id}, order_group_id={order_group_id}, order_id={order_response.get('id')}")
-                except aiohttp.ClientError as e:
-                    logging.error(f"Mahsulot uchun buyurtma yaratishda xato: {product_id}: {e}")
+                        order_response = await read_json(response)
+                        logging.info("Buyurtma yaratildi: product_id=%s, order_group_id=%s, order_id=%s", product_id, order_group_id, order_response.get('id'))
+                except (aiohttp.ClientError, ValueError) as e:
+                    logging.error("Mahsulot uchun buyurtma yaratishda xato: %s: %s", product_id, e)
                     success = False
                     await message.answer(
                         f"⚠️ Tarmoq xatosi mahsulot ID {product_id} uchun:\n<code>{html.escape(str(e))}</code>"
@@ -684,19 +673,19 @@ async def successful_payment_handler(message: types.Message):
                 # Backenddan yaratilgan buyurtmani qayta tekshirish
                 check_url = f"{BASE_API_URL.rstrip('/')}{ORDER_GROUPS_ENDPOINT.rstrip('/')}?chat_id={user_id}"
                 async with session.get(check_url) as check_response:
-                    check_text = await check_response.text()
                     if check_response.status == 200:
-                        orders = await check_response.json()
-                        logging.info(f"Backenddan buyurtma tekshirildi: user_id={user_id}, buyurtmalar={orders}")
+                        orders = await read_json(check_response)
+                        logging.info("Backenddan buyurtma tekshirildi: user_id=%s, buyurtmalar=%s", user_id, truncate(orders), extra=SAMPLED)
                         for order in orders:
                             if order["id"] == order_group_id:
-                                logging.info(f"Tekshirilgan OrderGroup: ID={order_group_id}, manzil={order.get('delivery_address', 'Manzil topilmadi')}")
+                                logging.info("Tekshirilgan OrderGroup: ID=%s, manzil=%s", order_group_id, order.get('delivery_address', 'Manzil topilmadi'))
                     else:
-                        logging.error(f"Buyurtma tekshirishda xato: status={check_response.status}, javob={check_text}")
+                        check_text = await check_response.text()
+                        logging.error("Buyurtma tekshirishda xato: status=%s, javob=%s", check_response.status, truncate(check_text))
             else:
                 await message.answer("⚠️ Buyurtma to'liq qayta ishlanmadi. Iltimos, administrator bilan bog'laning.")
-        except aiohttp.ClientError as e:
-            logging.error(f"Buyurtma yaratishda xato: {e}")
+        except (aiohttp.ClientError, ValueError) as e:
+            logging.error("Buyurtma yaratishda xato: %s", e)
             await message.answer(
                 f"⚠️ Tarmoq xatosi:\n<code>{html.escape(str(e))}</code>"
             )
@@ -705,35 +694,34 @@ async def successful_payment_handler(message: types.Message):
 @dp.message(lambda message: message.text == "📜 Buyurtmalarim")
 async def orders_handler(message: types.Message):
     user_id = str(message.from_user.id)
-    logging.info(f"Buyurtmalar olinmoqda: chat_id={user_id}")
+    logging.info("Buyurtmalar olinmoqda: chat_id=%s", user_id)
 
-    async with aiohttp.ClientSession() as session:
+    async with aiohttp.ClientSession(json_serialize=json_dumps) as session:
         try:
             user_url = f"{BASE_API_URL.rstrip('/')}{USERS_ENDPOINT.rstrip('/')}?chat_id={user_id}"
-            logging.info(f"Foydalanuvchi tekshirilmoqda: {user_url}")
+            logging.info("Foydalanuvchi tekshirilmoqda: %s", user_url, extra=SAMPLED)
             async with session.get(user_url) as user_resp:
-                response_text = await user_resp.text()
                 if user_resp.status != 200:
-                    logging.error(f"BotUser'ni olishda xato, status: {user_resp.status}, javob: {response_text}")
+                    response_text = await user_resp.text()
+                    logging.error("BotUser'ni olishda xato, status: %s, javob: %s", user_resp.status, truncate(response_text))
                     await message.answer(f"❌ Foydalanuvchi ma'lumotlarini olishda xatolik, status kodi: {user_resp.status}.")
                     return
-                user_data = await user_resp.json()
+                user_data = await read_json(user_resp)
                 if not user_data or len(user_data) != 1:
-                    logging.error(f"Chat_id uchun BotUser topilmadi yoki bir nechta: {user_id}: {user_data}")
+                    logging.error("Chat_id uchun BotUser topilmadi yoki bir nechta: %s: %s", user_id, truncate(user_data))
                     await message.answer(
                         "❌ Ro'yxatdan o'tmagansiz. Iltimos, /start buyrug'ini yuboring."
                     )
                     return
                 bot_user_id = user_data[0]["id"]
-                logging.info(f"BotUser ID: {bot_user_id}, chat_id: {user_id}")
+                logging.info("BotUser ID: %s, chat_id: %s", bot_user_id, user_id)
 
             url = f"{BASE_API_URL.rstrip('/')}{ORDER_GROUPS_ENDPOINT.rstrip('/')}?chat_id={user_id}"
-            logging.info(f"OrderGroups so'rovi: {url}")
+            logging.info("OrderGroups so'rovi: %s", url, extra=SAMPLED)
             async with session.get(url) as response:
-                response_text = await response.text()
                 if response.status == 200:
-                    order_groups = await response.json()
-                    logging.info(f"OrderGroups javobi: {order_groups}")
+                    order_groups = await read_json(response)
+                    logging.info("OrderGroups javobi: %s", truncate(order_groups), extra=SAMPLED)
                     if not order_groups:
                         await message.answer("📭 Hozircha buyurtmalaringiz yo'q.")
                         return
@@ -752,13 +740,13 @@ async def orders_handler(message: types.Message):
                             subtotal = float(order.get("subtotal", "0")) if order.get("subtotal") else 0.0
 
                             async with session.get(f"{BASE_API_URL.rstrip('/')}{PRODUCTS_ENDPOINT.rstrip('/')}/{product_id}/") as prod_resp:
-                                response_text = await prod_resp.text()
                                 if prod_resp.status == 200:
-                                    product = await prod_resp.json()
+                                    product = await read_json(prod_resp)
                                     product_name = product.get("name", "Noma'lum mahsulot")
                                     price = float(product.get("price", "0")) if product.get("price") else 0.0
                                 else:
-                                    logging.error(f"Mahsulotni olishda xato: {product_id}, status: {prod_resp.status}, javob: {response_text}")
+                                    response_text = await prod_resp.text()
+                                    logging.error("Mahsulotni olishda xato: %s, status: %s, javob: %s", product_id, prod_resp.status, truncate(response_text))
                                     product_name = "Noma'lum mahsulot"
                                     price = 0.0
 
@@ -770,11 +758,7 @@ async def orders_handler(message: types.Message):
                             )
 
                         is_paid = "To'langan" if group.get("is_paid", False) else "To'lanmagan"
-                        status = {
-                            "active": "Faol",
-                            "delivered": "Yetkazib berilgan",
-                            "cancelled": "Bekor qilingan"
-                        }.get(group.get("status"), "Noma'lum")
+                        status = ORDER_STATUS_LABELS.get(group.get("status"), "Noma'lum")
                         group_text.append(
                             f"📍 Yetkazib berish manzili: {delivery_address}\n"
                             f"💳 To'lov holati: {is_paid}\n"
@@ -786,12 +770,69 @@ async def orders_handler(message: types.Message):
                     text = "\n\n".join(text_lines)
                     await message.answer(f"📜 Buyurtmalaringiz:\n\n{text}")
                 else:
-                    logging.error(f"OrderGroups'ni olishda xato, status: {response.status}, javob: {response_text}")
+                    response_text = await response.text()
+                    logging.error("OrderGroups'ni olishda xato, status: %s, javob: %s", response.status, truncate(response_text))
                     await message.answer(f"❌ Buyurtmalarni olishda xatolik, status kodi: {response.status}, javob: {response_text[:200]}")
-        except aiohttp.ClientError as e:
-            logging.error(f"Buyurtmalarni olishda xato: {e}")
+        except (aiohttp.ClientError, ValueError) as e:
+            logging.error("Buyurtmalarni olishda xato: %s", e)
             await message.answer(f"⚠️ Xatolik:\n<code>{html.escape(str(e))}</code>")
 
+# 📂 Polling boshlanishidan oldin holatni tiklash
+@dp.startup()
+async def on_startup():
+    restore_started = time.perf_counter()
+    if not os.path.exists(SNAPSHOT_PATH):
+        # Heroku kabi platformalarda ishchi papka har restartda tozalanadi
+        logging.warning(
+            "Snapshot topilmadi: %s. Holat restartdan keyin saqlanishi uchun SNAPSHOT_PATH doimiy xotirada bo'lishi kerak",
+            SNAPSHOT_PATH
+        )
+    try:
+        count, lazy = snapshot.restore()
+    except (OSError, ValueError) as e:
+        logging.error("Snapshotni tiklashda xato: %s: %s", SNAPSHOT_PATH, e)
+        count, lazy = 0, False
+    now = time.perf_counter()
+    logging.info(
+        "Ishga tushish vaqti: %.1f ms (snapshot: %d foydalanuvchi, %.1f ms, lazy=%s)",
+        (now - STARTED_AT) * 1000, count, (now - restore_started) * 1000, lazy
+    )
+
+    if NOTIFY_MODE != "off":
+        try:
+            await notifier.start(
+                bot, NOTIFY_MODE,
+                poll_url=f"{BASE_API_URL.rstrip('/')}{ORDER_GROUPS_ENDPOINT.rstrip('/')}/",
+                cursor_param=NOTIFY_CURSOR_PARAM,
+                poll_interval=NOTIFY_POLL_INTERVAL,
+                http_host=NOTIFY_HTTP_HOST,
+                http_port=NOTIFY_HTTP_PORT,
+                http_path=NOTIFY_HTTP_PATH,
+                secret=NOTIFY_SECRET,
+            )
+        except ValueError as e:
+            logging.error("Bildirishnomalar ishga tushmadi: %s", e)
+
+# 💾 SIGTERM: update'larni yakunlash va holatni saqlash
+@dp.shutdown()
+async def on_shutdown():
+    if NOTIFY_MODE != "off":
+        await notifier.stop()
+    shutdown_started = time.perf_counter()
+    # aiogram getUpdates partiyasidagi har bir update uchun vazifa yaratadi; hali
+    # boshlanmaganlari middleware'ga yetib kelmagan, shuning uchun ular ham kutiladi.
+    # Dispatcher'da buning uchun ochiq API yo'q.
+    unfinished = await snapshot.drain(SHUTDOWN_DRAIN_TIMEOUT, tasks=set(dp._handle_update_tasks))
+    if unfinished:
+        logging.warning("Drain vaqti tugadi, %d ta update tugallanmadi", unfinished)
+    try:
+        count, fsm_count = snapshot.dump()
+    except OSError as e:
+        logging.error("Snapshotni saqlashda xato: %s: %s", SNAPSHOT_PATH, e)
+        return
+    logging.info("Snapshot saqlandi: %s, foydalanuvchilar=%d, FSM yozuvlari=%d, vaqt=%.1f ms",
+                 SNAPSHOT_PATH, count, fsm_count, (time.perf_counter() - shutdown_started) * 1000)
+
 # 🔃 Botni ishga tushirish
 async def main():
     await dp.start_polling(bot)
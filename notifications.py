@@ -0,0 +1,377 @@
+"""
+Buyurtma holati o'zgarganda mijozlarga push-bildirishnoma yuborish.
+
+Hodisalar ikki manbadan keladi:
+    - "http": backend POST {NOTIFY_HTTP_PATH} ga JSON yuboradi
+      ({"order_group": 12, "chat_id": 123, "status": "delivered"} yoki ularning ro'yxati)
+    - "poll": ORDER_GROUPS_ENDPOINT'ni cursor (updated_at) bilan davriy so'rash
+
+Hodisalar har NOTIFY_BATCH_INTERVAL soniyada yig'iladi, bitta chatga bitta xabar
+bo'lib birlashtiriladi va Telegram limitlari (NOTIFY_RATE xabar/s) doirasida yuboriladi.
+Yetkazilmagan hodisalar, cursor, yakunlanmagan buyurtmalar holati va oxirgi
+yakunlangan buyurtmalar NOTIFY_STATE_PATH fayliga fon oqimida, ko'pi bilan har NOTIFY_SAVE_INTERVAL soniyada saqlanadi.
+"""
+import asyncio
+import ipaddress
+import logging
+import os
+import time
+
+import aiohttp
+from aiohttp import web
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError, TelegramRetryAfter
+
+from json_codec import json_dumps, json_loads, read_json
+from logging_setup import truncate
+
+ORDER_STATUS_LABELS = {
+    "active": "Faol",
+    "delivered": "Yetkazib berilgan",
+    "cancelled": "Bekor qilingan"
+}
+# Bu holatlardan keyin buyurtma o'zgarmaydi: ular `statuses`dan chiqarilib,
+# takroriy xabar yubormaslik uchun cheklangan `finished` lug'atida eslab qolinadi
+FINAL_STATUSES = {"delivered", "cancelled"}
+
+
+def _validate_event(event):
+    """Hodisani tekshirish va (order_group, chat_id, status) ko'rinishiga keltirish"""
+    if not isinstance(event, dict):
+        raise ValueError("hodisa JSON obyekt bo'lishi kerak")
+    group_id = event.get("order_group")
+    chat_id = event.get("chat_id")
+    status = event.get("status")
+    if isinstance(group_id, bool) or not str(group_id).isdigit():
+        raise ValueError(f"noto'g'ri order_group: {group_id!r}")
+    if isinstance(chat_id, bool) or not isinstance(chat_id, (int, str)) or not str(chat_id).lstrip("-").isdigit():
+        raise ValueError(f"noto'g'ri chat_id: {chat_id!r}")
+    if status not in ORDER_STATUS_LABELS:
+        raise ValueError(f"noto'g'ri status: {status!r}")
+    return str(group_id), str(int(chat_id)), status
+
+
+def _is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class RateLimiter:
+    """Xabarlarni sekundiga `rate` tadan oshirmasdan yuborish uchun navbat"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self._next = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, seconds):
+        """RetryAfter: barcha keyingi yuborishlarni kechiktirish"""
+        self._next = max(self._next, time.monotonic() + seconds)
+
+
+class OrderStatusNotifier:
+    """Holat o'zgarishi hodisalarini qabul qilish, guruhlash va yuborish"""
+
+    def __init__(self, state_path, rate=25, batch_interval=1.0, save_interval=5.0, max_attempts=5,
+                 max_finished=10000):
+        self.state_path = state_path
+        self.limiter = RateLimiter(rate)
+        self.batch_interval = batch_interval
+        self.save_interval = save_interval
+        self.max_attempts = max_attempts
+        self.max_finished = max_finished
+        # chat_id (str) -> [hodisa, ...]; yetkazilguncha saqlanadi
+        self.pending = {}
+        self.attempts = {}
+        # order_group (str) -> oxirgi holat; faqat yakunlanmagan buyurtmalar
+        self.statuses = {}
+        # order_group (str) -> yakuniy holat; eng eskilari max_finished'dan oshganda o'chiriladi
+        self.finished = {}
+        self.cursor = None
+        self.sent = 0
+        self.failed = 0
+        self._wakeup = asyncio.Event()
+        self._dirty = False
+        self._tasks = []
+        self._runner = None
+        self._started_at = None
+
+    # 💾 Holatni saqlash
+    def load(self):
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "rb") as f:
+                state = json_loads(f.read())
+        except (OSError, ValueError) as e:
+            logging.error("Bildirishnoma holatini o'qishda xato: %s: %s", self.state_path, e)
+            return
+        if not isinstance(state, dict):
+            logging.error("Bildirishnoma holati noto'g'ri formatda: %s", self.state_path)
+            return
+        # Noto'g'ri yozuvlar yuboruvchini har safar to'xtatmasligi uchun tashlab yuboriladi
+        self.pending = {}
+        pending = state.get("pending")
+        for chat_id, events in (pending.items() if isinstance(pending, dict) else ()):
+            for event in (events if isinstance(events, list) else ()):
+                try:
+                    group_id, chat_id, status = _validate_event(
+                        {**event, "chat_id": chat_id} if isinstance(event, dict) else event
+                    )
+                except ValueError as e:
+                    logging.warning("Saqlangan bildirishnoma tashlab yuborildi: %s", e)
+                    continue
+                self.pending.setdefault(chat_id, []).append({"order_group": group_id, "status": status})
+        statuses = state.get("statuses")
+        finished = state.get("finished")
+        self.statuses = {}
+        self.finished = {}
+        for group_id, status in (statuses.items() if isinstance(statuses, dict) else ()):
+            if status in FINAL_STATUSES:
+                self._remember_finished(group_id, status)
+            else:
+                self.statuses[group_id] = status
+        for group_id, status in (finished.items() if isinstance(finished, dict) else ()):
+            self._remember_finished(group_id, status)
+        cursor = state.get("cursor")
+        self.cursor = cursor if isinstance(cursor, str) else None
+        if self.pending:
+            self._wakeup.set()
+
+    def _write(self, payload):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, self.state_path)
+
+    async def save(self):
+        """Holatni faylga yozish; fayl operatsiyalari event loop'ni to'xtatmasligi uchun oqimda bajariladi"""
+        self._dirty = False
+        # Serializatsiya loop'da: lug'atlar yozish paytida o'zgarmasligi uchun
+        payload = json_dumps({
+            "cursor": self.cursor, "statuses": self.statuses,
+            "finished": self.finished, "pending": self.pending
+        })
+        try:
+            await asyncio.to_thread(self._write, payload)
+        except OSError as e:
+            self._dirty = True
+            logging.error("Bildirishnoma holatini saqlashda xato: %s: %s", self.state_path, e)
+
+    async def run_saver(self):
+        """O'zgarishlarni har `save_interval` soniyada bitta yozuvga birlashtirish"""
+        while True:
+            await asyncio.sleep(self.save_interval)
+            if self._dirty:
+                await self.save()
+
+    # 📥 Hodisalarni qabul qilish
+    def push(self, event):
+        """Bitta hodisani navbatga qo'shish; holat o'zgarmagan bo'lsa e'tiborsiz qoldiriladi.
+
+        Yakuniy holatga o'tgan buyurtma `statuses`dan `finished`ga ko'chiriladi, shuning
+        uchun bir xil yakuniy hodisa qayta kelsa ham xabar ikkinchi marta yuborilmaydi.
+        Noto'g'ri hodisada ValueError ko'tariladi.
+        """
+        group_id, chat_id, status = _validate_event(event)
+        if status == self.statuses.get(group_id, self.finished.get(group_id)):
+            return False
+        self._track(group_id, status)
+        self.pending.setdefault(chat_id, []).append(
+            {"order_group": group_id, "status": status}
+        )
+        self._dirty = True
+        self._wakeup.set()
+        return True
+
+    def _remember_finished(self, group_id, status):
+        self.finished.pop(group_id, None)
+        self.finished[group_id] = status
+        while len(self.finished) > self.max_finished:
+            del self.finished[next(iter(self.finished))]
+
+    def _track(self, group_id, status):
+        """Buyurtmaning oxirgi holatini `statuses` yoki `finished`ga yozish"""
+        if status in FINAL_STATUSES:
+            self.statuses.pop(group_id, None)
+            self._remember_finished(group_id, status)
+        else:
+            self.finished.pop(group_id, None)
+            self.statuses[group_id] = status
+
+    async def http_handler(self, request, secret=None):
+        if secret and request.headers.get("X-Notify-Secret") != secret:
+            return web.json_response({"detail": "Forbidden"}, status=403)
+        try:
+            payload = json_loads(await request.read())
+            events = payload if isinstance(payload, list) else [payload]
+            # Avval hammasini tekshirish: noto'g'ri so'rovdan hech narsa navbatga tushmasin
+            for event in events:
+                _validate_event(event)
+        except ValueError as e:
+            return web.json_response({"detail": f"Noto'g'ri hodisa: {e}"}, status=400)
+        accepted = sum(self.push(event) for event in events)
+        return web.json_response({"accepted": accepted})
+
+    async def poll(self, url, cursor_param, interval):
+        """ORDER_GROUPS_ENDPOINT'ni cursor bilan davriy so'rash"""
+        async with aiohttp.ClientSession(json_serialize=json_dumps) as session:
+            while True:
+                params = {cursor_param: self.cursor} if self.cursor else {}
+                try:
+                    async with session.get(url, params=params) as response:
+                        if response.status == 200:
+                            groups = await read_json(response)
+                            if isinstance(groups, list):
+                                self._apply_groups(groups)
+                            else:
+                                logging.error("Buyurtma holatlari ro'yxat ko'rinishida kelmadi: %s", type(groups).__name__)
+                        else:
+                            logging.error("Buyurtma holatlarini olishda xato, status: %s", response.status)
+                except (aiohttp.ClientError, ValueError) as e:
+                    logging.error("Buyurtma holatlarini olishda xato: %s", e)
+                except Exception:
+                    # Kutilmagan xato bitta so'rovni yo'qotadi, lekin so'rovchini to'xtatmaydi
+                    logging.exception("Buyurtma holatlarini qayta ishlashda kutilmagan xato")
+                await asyncio.sleep(interval)
+
+    def _apply_groups(self, groups):
+        # Birinchi so'rov: faqat cursor va yakunlanmagan buyurtmalarni eslab qolish,
+        # eski buyurtmalar haqida xabar yuborilmaydi
+        seed = self.cursor is None and not self.statuses and not self.finished
+        previous_cursor = self.cursor
+        for group in groups:
+            if not isinstance(group, dict) or group.get("id") is None:
+                logging.warning("Buyurtma guruhi tashlab yuborildi: %s", truncate(group))
+                continue
+            updated_at = group.get("updated_at")
+            if not isinstance(updated_at, str):
+                updated_at = None
+            if updated_at and (self.cursor is None or updated_at > self.cursor):
+                self.cursor = updated_at
+            # Backend cursor parametrini e'tiborsiz qoldirsa ham eski o'zgarishlar qayta ishlanmaydi
+            if updated_at and previous_cursor is not None and updated_at <= previous_cursor:
+                continue
+            bot_user = group.get("bot_user")
+            chat_id = group.get("chat_id") or (bot_user.get("chat_id") if isinstance(bot_user, dict) else None)
+            group_id = str(group["id"])
+            status = group.get("status")
+            if seed or chat_id is None:
+                if status in ORDER_STATUS_LABELS:
+                    self._track(group_id, status)
+                continue
+            # Bot o'zi yaratgan yangi buyurtma "active" holatda keladi
+            if group_id not in self.statuses and status == "active":
+                self._track(group_id, status)
+                continue
+            try:
+                self.push({"order_group": group_id, "chat_id": chat_id, "status": status})
+            except ValueError as e:
+                logging.warning("Buyurtma holati hodisasi tashlab yuborildi: %s", e)
+        self._dirty = True
+
+    # 📤 Yuborish
+    def _render(self, events):
+        lines = ["🔔 Buyurtmangiz holati o'zgardi:"]
+        for event in events:
+            label = ORDER_STATUS_LABELS.get(event["status"], "Noma'lum")
+            lines.append(f"📦 Buyurtma guruh ID: <b>{event['order_group']}</b> — {label}")
+        return "\n".join(lines)
+
+    async def _deliver(self, bot, chat_id, events):
+        """True - yetkazildi yoki qayta urinishning ma'nosi yo'q; False - keyinroq qayta urinish"""
+        await self.limiter.wait()
+        try:
+            await bot.send_message(chat_id=int(chat_id), text=self._render(events))
+        except TelegramRetryAfter as e:
+            self.limiter.pause(e.retry_after)
+            return False
+        except TelegramForbiddenError:
+            # Foydalanuvchi botni bloklagan
+            self.failed += 1
+            return True
+        except TelegramAPIError as e:
+            attempts = self.attempts.get(chat_id, 0) + 1
+            self.attempts[chat_id] = attempts
+            logging.warning("Bildirishnoma yuborishda xato: chat_id=%s, urinish=%d: %s", chat_id, attempts, e)
+            if attempts >= self.max_attempts:
+                self.failed += 1
+                return True
+            return False
+        self.sent += 1
+        return True
+
+    async def run_sender(self, bot):
+        while True:
+            await self._wakeup.wait()
+            # Bir oz kutib, shu vaqt ichida kelgan hodisalarni bitta xabarga birlashtirish
+            await asyncio.sleep(self.batch_interval)
+            self._wakeup.clear()
+            batch = {chat_id: list(events) for chat_id, events in self.pending.items()}
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                *(self._deliver(bot, chat_id, events) for chat_id, events in batch.items()),
+                return_exceptions=True
+            )
+            for (chat_id, events), delivered in zip(batch.items(), results):
+                # Kutilmagan xato bitta chatni yo'qotadi, lekin yuboruvchini to'xtatmaydi
+                if isinstance(delivered, Exception):
+                    logging.error("Bildirishnoma yuborishda kutilmagan xato: chat_id=%s: %s", chat_id, delivered)
+                    self.failed += 1
+                    delivered = True
+                if delivered:
+                    remaining = self.pending.get(chat_id, [])[len(events):]
+                    if remaining:
+                        self.pending[chat_id] = remaining
+                    else:
+                        self.pending.pop(chat_id, None)
+                    self.attempts.pop(chat_id, None)
+            if self.pending:
+                self._wakeup.set()
+            self._dirty = True
+            elapsed = time.perf_counter() - started
+            total_elapsed = time.monotonic() - self._started_at
+            logging.info(
+                "Bildirishnomalar: partiya=%d chat, %.1f ms; jami yuborilgan=%d, xato=%d, navbatda=%d, %.2f xabar/s",
+                len(batch), elapsed * 1000, self.sent, self.failed, len(self.pending),
+                self.sent / total_elapsed if total_elapsed else 0.0
+            )
+
+    # 🔃 Ishga tushirish va to'xtatish
+    async def start(self, bot, mode, poll_url=None, cursor_param="updated_since", poll_interval=30.0,
+                    http_host="127.0.0.1", http_port=8080, http_path="/notifications/order-status", secret=None):
+        # Sirsiz ochiq endpoint orqali istalgan chatga xabar yuborish mumkin bo'lardi
+        if mode == "http" and not secret and not _is_loopback(http_host):
+            raise ValueError(f"NOTIFY_SECRET berilmagan: http rejimi faqat loopback manzilda ishlaydi ({http_host})")
+        self.load()
+        self._started_at = time.monotonic()
+        self._tasks.append(asyncio.create_task(self.run_sender(bot)))
+        self._tasks.append(asyncio.create_task(self.run_saver()))
+        if mode == "poll":
+            self._tasks.append(asyncio.create_task(self.poll(poll_url, cursor_param, poll_interval)))
+        elif mode == "http":
+            app = web.Application()
+            app.router.add_post(http_path, lambda request: self.http_handler(request, secret))
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, http_host, http_port).start()
+        logging.info("Bildirishnomalar ishga tushdi: rejim=%s, navbatda=%d chat", mode, len(self.pending))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        await self.save()
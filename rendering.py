@@ -0,0 +1,69 @@
+"""
+Tez-tez ko'rsatiladigan ekranlar uchun oldindan tayyorlangan klaviaturalar va matnlar.
+
+aiogram markup obyektlari bir necha marta yuborilishi mumkin, shuning uchun ular
+bir marta quriladi va keshdan qaytariladi.
+"""
+import html
+from functools import lru_cache
+
+from aiogram.types import (
+    ReplyKeyboardMarkup, KeyboardButton,
+    InlineKeyboardMarkup, InlineKeyboardButton
+)
+
+_ADD_TO_CART_ROW = (InlineKeyboardButton(text="🛒 Savatchaga qo'shish", callback_data="add_to_cart"),)
+_DECREASE_BUTTON = InlineKeyboardButton(text="➖", callback_data="qty_decrease")
+_INCREASE_BUTTON = InlineKeyboardButton(text="➕", callback_data="qty_increase")
+_MENU_ROW = (KeyboardButton(text="🛍 Savatchani ko'rish"), KeyboardButton(text="📜 Buyurtmalarim"))
+
+# Katalog versiyasi (kategoriya nomlari) -> klaviatura
+_category_keyboard = (None, None)
+
+
+def category_keyboard(categories):
+    """Kategoriyalar klaviaturasi; katalog o'zgarmaguncha bitta obyekt qaytariladi"""
+    global _category_keyboard
+    version = tuple(cat["name"] for cat in categories)
+    cached_version, keyboard = _category_keyboard
+    if version == cached_version:
+        return keyboard
+
+    buttons = [
+        [KeyboardButton(text=name) for name in version[i:i + 2]]
+        for i in range(0, len(version), 2)
+    ]
+    buttons.append(list(_MENU_ROW))
+    keyboard = ReplyKeyboardMarkup(keyboard=buttons, resize_keyboard=True)
+    _category_keyboard = (version, keyboard)
+    return keyboard
+
+
+@lru_cache(maxsize=64)
+def quantity_keyboard(qty):
+    """➖ / miqdor / ➕ va savatchaga qo'shish tugmalari"""
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [_DECREASE_BUTTON, InlineKeyboardButton(text=f"{qty} ta", callback_data="noop"), _INCREASE_BUTTON],
+            list(_ADD_TO_CART_ROW)
+        ]
+    )
+
+
+@lru_cache(maxsize=1024)
+def _product_caption(name, price, category_name, stock, description):
+    return (
+        f"<b>📦 {html.escape(str(name))}</b>\n"
+        f"💰 Narxi: <b>{price}</b> so'm\n"
+        f"🗂 Kategoriya: {html.escape(str(category_name))}\n"
+        f"🧮 Zaxira: {stock} dona\n\n"
+        f"<i>{html.escape(str(description)) if description else 'ℹ️ Tavsif mavjud emas'}</i>"
+    )
+
+
+def product_caption(product):
+    """HTML-escape qilingan mahsulot matni; mahsulot maydonlari (versiyasi) bo'yicha keshlanadi"""
+    return _product_caption(
+        product["name"], product["price"], product["category_name"],
+        product["stock"], product["description"]
+    )
@@ -0,0 +1,197 @@
+"""
+Sessiya holatini diskka saqlash va qayta tiklash.
+
+Fayl formati (little-endian):
+    b"ESB3" | index_offset (8 bayt) | yozuvlar... | index
+
+Har bir yozuv bitta foydalanuvchining JSON ko'rinishidagi holati (tanlangan mahsulot,
+savatcha, manzil). Index esa JSON: {"users": {user_id: [offset, length]}, "fsm": [...]}.
+pickle ishlatilmaydi: fayl umumiy diskda turishi mumkin va uni o'zgartira olgan
+kishi bot ichida kod bajara olmasligi kerak.
+Katta snapshotlar mmap orqali ochiladi va har bir foydalanuvchi yozuvi faqat
+uning birinchi update'ida yuklanadi. FSM holatlari esa doim darhol tiklanadi:
+aiogram'ning FSMContextMiddleware holatni bizning middleware'dan oldin o'qiydi.
+"""
+import asyncio
+import dataclasses
+import mmap
+import os
+import struct
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorageRecord
+
+from json_codec import json_dumps, json_loads
+
+MAGIC = b"ESB3"
+HEADER = struct.Struct("<4sQ")
+# JSON kalitlari faqat satr bo'ladi; boshqa kalitli lug'atlar (savatchadagi int product_id)
+# {"__pairs__": [[kalit, qiymat], ...]} ko'rinishida saqlanadi
+_PAIRS = "__pairs__"
+
+
+def _encode(value):
+    if isinstance(value, dict):
+        if _PAIRS not in value and all(isinstance(key, str) for key in value):
+            return {key: _encode(item) for key, item in value.items()}
+        return {_PAIRS: [[key, _encode(item)] for key, item in value.items()]}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if len(value) == 1 and _PAIRS in value:
+            return {key: _decode(item) for key, item in value[_PAIRS]}
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+
+def _dumps(value):
+    return json_dumps(_encode(value)).encode()
+
+
+def _loads(data):
+    return _decode(json_loads(data))
+
+
+class StateSnapshot:
+    """Foydalanuvchi lug'atlari va MemoryStorage uchun snapshot/restore"""
+
+    def __init__(self, path, stores, storage, lazy_threshold=1024 * 1024):
+        self.path = path
+        # {"cart": user_cart, ...} - kalitlari str(user_id) bo'lgan lug'atlar
+        self.stores = stores
+        self.storage = storage
+        self.lazy_threshold = lazy_threshold
+        self._mm = None
+        self._pending = {}
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    # 💾 Saqlash
+    def _collect(self, user_id):
+        return {name: store[user_id] for name, store in self.stores.items() if user_id in store}
+
+    def _collect_fsm(self):
+        return [
+            (dataclasses.astuple(key), value.state, value.data)
+            for key, value in self.storage.storage.items()
+            if value.state is not None or value.data
+        ]
+
+    def dump(self):
+        """Barcha holatni atomar tarzda faylga yozish; yozilgan foydalanuvchilar va FSM yozuvlari sonini qaytaradi"""
+        user_ids = set(self._pending)
+        for store in self.stores.values():
+            user_ids.update(store)
+
+        index = {}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, 0))
+            for user_id in user_ids:
+                if user_id in self._pending:
+                    # Hali yuklanmagan foydalanuvchi: eski baytlar o'zgarishsiz ko'chiriladi
+                    offset, length = self._pending[user_id]
+                    payload = self._mm[offset:offset + length]
+                else:
+                    record = self._collect(user_id)
+                    if not record:
+                        continue
+                    payload = _dumps(record)
+                index[user_id] = (f.tell(), len(payload))
+                f.write(payload)
+            index_offset = f.tell()
+            fsm = self._collect_fsm()
+            f.write(_dumps({"users": index, "fsm": fsm}))
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, index_offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        return len(index), len(fsm)
+
+    # 📂 Tiklash
+    def restore(self):
+        """Snapshotni ochish; (foydalanuvchilar soni, lazy rejimmi) qaytaradi"""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < HEADER.size:
+            return 0, False
+
+        with open(self.path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_offset = HEADER.unpack_from(mm)
+        if magic != MAGIC:
+            mm.close()
+            raise ValueError(f"Noto'g'ri snapshot fayli: {self.path}")
+
+        try:
+            index = _loads(mm[index_offset:])
+            fsm = [(StorageKey(*key), state, data) for key, state, data in index["fsm"]]
+            users = {user_id: tuple(location) for user_id, location in index["users"].items()}
+        except (KeyError, TypeError, ValueError) as e:
+            mm.close()
+            raise ValueError(f"Noto'g'ri snapshot indeksi: {self.path}: {e}") from e
+        for key, state, data in fsm:
+            self.storage.storage[key] = MemoryStorageRecord(data=data, state=state)
+        self._pending = users
+        self._mm = mm
+        count = len(self._pending)
+        if len(mm) > self.lazy_threshold:
+            return count, True
+
+        for user_id in list(self._pending):
+            self.hydrate(user_id)
+        self._mm = None
+        mm.close()
+        return count, False
+
+    def hydrate(self, user_id):
+        """Foydalanuvchi holatini snapshotdan xotiraga yuklash (agar hali yuklanmagan bo'lsa)"""
+        location = self._pending.pop(user_id, None)
+        if location is None:
+            return
+        offset, length = location
+        record = _loads(self._mm[offset:offset + length])
+        for name, store in self.stores.items():
+            if name in record:
+                store.setdefault(user_id, record[name])
+
+    # 🔁 Update'lar oqimi
+    async def middleware(self, handler, event, data):
+        """Foydalanuvchi holatini kerak bo'lganda yuklash va bajarilayotgan update'larni sanash"""
+        user = data.get("event_from_user")
+        if user is not None and self._pending:
+            self.hydrate(str(user.id))
+
+        self._in_flight += 1
+        self._idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._idle.set()
+
+    async def drain(self, timeout, tasks=()):
+        """Update'lar tugashini `timeout` soniyagacha kutish; tugamay qolganlar sonini qaytaradi.
+
+        Middleware faqat handler'ga kirgan update'larni sanaydi. Dispatcher yaratgan,
+        lekin hali boshlanmagan vazifalar shu sababli `tasks` orqali alohida beriladi;
+        ular berilmasa, bunday update'lar kutilmasdan yo'qolishi mumkin. Vaqt tugasa
+        ham tugallanmagan update'lar yo'qoladi.
+        """
+        deadline = asyncio.get_running_loop().time() + timeout
+        pending = {task for task in tasks if not task.done()}
+        if pending:
+            _, pending = await asyncio.wait(pending, timeout=timeout)
+        try:
+            await asyncio.wait_for(self._idle.wait(), max(0.0, deadline - asyncio.get_running_loop().time()))
+        except asyncio.TimeoutError:
+            pass
+        return max(self._in_flight, len(pending))
+
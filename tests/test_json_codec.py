@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+import pytest
+
+from json_codec import iter_json_array
+
+
+class FakeContent:
+    def __init__(self, body, chunk_size):
+        self.body = body
+        self.chunk_size = chunk_size
+
+    async def read(self, n):
+        chunk, self.body = self.body[:self.chunk_size], self.body[self.chunk_size:]
+        return chunk
+
+
+class FakeResponse:
+    def __init__(self, body, chunk_size=1, content_length=None):
+        self.body = body
+        self.content = FakeContent(body, chunk_size)
+        self.content_length = content_length
+
+    async def read(self):
+        return self.body
+
+
+def collect(body, **kwargs):
+    async def run():
+        return [item async for item in iter_json_array(FakeResponse(body, **kwargs))]
+    return asyncio.run(run())
+
+
+DATA = [
+    {"id": 1, "name": "Ўзбек ñ \"x\" ]", "nested": [1, {"a": "}"}]},
+    123, -1.5e-7, 4500.0, "s", None, True, [], {},
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 100000])
+def test_chunk_boundaries(chunk_size):
+    body = json.dumps(DATA, ensure_ascii=False).encode()
+    assert collect(body, chunk_size=chunk_size) == DATA
+
+
+def test_small_body_uses_full_decode():
+    body = json.dumps(DATA).encode()
+    assert collect(body, content_length=len(body)) == DATA
+
+
+def test_empty_array():
+    assert collect(b" [ ] \n") == []
+
+
+@pytest.mark.parametrize("body", [
+    b"[1,]",
+    b"[1,,2]",
+    b"[,1]",
+    b"[1 2]",
+    b'[{"a": 1}{"b": 2}]',
+    b"[1] x",
+    b"[1][2]",
+    b'{"a": 1}',
+    b"[1",
+    b'[{"a": 1},',
+    b"",
+])
+@pytest.mark.parametrize("chunk_size", [1, 3, 100000])
+def test_malformed_input(body, chunk_size):
+    with pytest.raises(ValueError):
+        collect(body, chunk_size=chunk_size)
+
+
+@pytest.mark.parametrize("body", [b"[1,]", b'{"a": 1}'])
+def test_malformed_small_body(body):
+    with pytest.raises(ValueError):
+        collect(body, content_length=len(body))
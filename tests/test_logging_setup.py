@@ -0,0 +1,48 @@
+import logging
+
+from logging_setup import DeferredQueueHandler, SampleFilter, truncate
+
+
+class ListQueue(list):
+    def put_nowait(self, item):
+        self.append(item)
+
+
+def emit(*args, name="root", level=logging.INFO, exc_info=None):
+    queue = ListQueue()
+    handler = DeferredQueueHandler(queue)
+    handler.handle(logging.LogRecord(name, level, __file__, 1, args[0], args[1:], exc_info))
+    return queue[0]
+
+
+def test_single_dict_arg_is_kept_whole():
+    payload = {"a": [0, 1]}
+    record = emit("x %s", payload)
+    payload["a"].append(2)
+    assert record.getMessage() == "x {'a': [0, 1]}"
+
+    record = emit("x %(a)s", {"a": [0, 1]})
+    assert record.getMessage() == "x [0, 1]"
+
+
+def test_mutable_args_are_snapshotted_and_truncated():
+    items = [1, 2]
+    record = emit("%s %d %s", items, 5, truncate("y" * 10, limit=3))
+    items.append(3)
+    assert record.getMessage() == "[1, 2] 5 yyy...(+7)"
+
+
+def test_exc_info_is_kept_for_the_formatter():
+    try:
+        1 / 0
+    except ZeroDivisionError as e:
+        record = emit("xato", level=logging.ERROR, exc_info=(type(e), e, e.__traceback__))
+    assert record.exc_info is not None
+    assert "ZeroDivisionError" in logging.Formatter().format(record)
+
+
+def test_aiogram_event_info_is_sampled():
+    sample = SampleFilter(0.0, ["aiogram.event"])
+    assert not sample.filter(logging.LogRecord("aiogram.event", logging.INFO, __file__, 1, "Update", (), None))
+    assert sample.filter(logging.LogRecord("aiogram.event", logging.ERROR, __file__, 1, "Update", (), None))
+    assert sample.filter(logging.LogRecord("root", logging.INFO, __file__, 1, "x", (), None))
@@ -0,0 +1,148 @@
+import asyncio
+import json
+
+from aiogram.exceptions import TelegramAPIError
+
+from notifications import OrderStatusNotifier
+
+
+class FakeRequest:
+    def __init__(self, payload, headers=None):
+        self.body = json.dumps(payload).encode()
+        self.headers = headers or {}
+
+    async def read(self):
+        return self.body
+
+
+class FakeBot:
+    def __init__(self, notifier, fail=(), arrive=None):
+        self.notifier = notifier
+        self.fail = set(fail)
+        # Yuborish paytida kelgan hodisa
+        self.arrive = arrive
+        self.calls = []
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.calls.append(chat_id)
+        # Keyingi partiya test tekshiruvidan keyin boshlansin
+        self.notifier.batch_interval = 60
+        if self.arrive is not None:
+            self.notifier.push(self.arrive)
+            self.arrive = None
+        if chat_id in self.fail:
+            raise TelegramAPIError(None, "Bad Request")
+        self.sent.append(chat_id)
+
+
+def make_notifier(tmp_path, **kwargs):
+    return OrderStatusNotifier(str(tmp_path / "state.json"), rate=1000, batch_interval=0, **kwargs)
+
+
+def test_first_poll_only_seeds(tmp_path):
+    notifier = make_notifier(tmp_path)
+    notifier._apply_groups([
+        {"id": 1, "chat_id": 5, "status": "active", "updated_at": "2026-01-01"},
+        {"id": 2, "chat_id": 5, "status": "delivered", "updated_at": "2026-01-02"},
+    ])
+    assert notifier.pending == {}
+    assert notifier.statuses == {"1": "active"}
+    assert notifier.finished == {"2": "delivered"}
+    assert notifier.cursor == "2026-01-02"
+
+
+def test_repeat_polls_without_updated_at_do_not_resend(tmp_path):
+    notifier = make_notifier(tmp_path)
+    for _ in range(3):
+        notifier._apply_groups([{"id": 1, "chat_id": 5, "status": "delivered"}])
+    assert notifier.pending == {}
+
+    notifier._apply_groups([{"id": 2, "chat_id": 5, "status": "active"}])
+    for _ in range(3):
+        notifier._apply_groups([{"id": 2, "chat_id": 5, "status": "cancelled"}])
+    assert notifier.pending == {"5": [{"order_group": "2", "status": "cancelled"}]}
+    assert "2" not in notifier.statuses
+
+
+def test_repeat_polls_skip_rows_older_than_cursor(tmp_path):
+    notifier = make_notifier(tmp_path)
+    notifier._apply_groups([{"id": 1, "chat_id": 5, "status": "active", "updated_at": "2026-01-01"}])
+    changed = [{"id": 1, "chat_id": 5, "status": "delivered", "updated_at": "2026-01-02"}]
+    notifier._apply_groups(changed)
+    notifier._apply_groups(changed)
+    assert notifier.pending == {"5": [{"order_group": "1", "status": "delivered"}]}
+
+
+def test_bad_rows_are_skipped(tmp_path):
+    notifier = make_notifier(tmp_path)
+    notifier._apply_groups([{"id": 1, "chat_id": 5, "status": "active"}])
+    notifier._apply_groups(["count", {"status": "delivered"}, {"id": 1, "chat_id": 5, "status": "delivered"}])
+    assert notifier.pending == {"5": [{"order_group": "1", "status": "delivered"}]}
+
+
+def test_push_dedupe(tmp_path):
+    notifier = make_notifier(tmp_path)
+    event = {"order_group": 7, "chat_id": 5, "status": "delivered"}
+    assert notifier.push(event) is True
+    assert notifier.push(event) is False
+    assert notifier.push({**event, "chat_id": "5"}) is False
+    assert notifier.pending == {"5": [{"order_group": "7", "status": "delivered"}]}
+
+
+def test_finished_is_bounded(tmp_path):
+    notifier = make_notifier(tmp_path, max_finished=2)
+    for group_id in range(3):
+        notifier.push({"order_group": group_id, "chat_id": 5, "status": "delivered"})
+    assert list(notifier.finished) == ["1", "2"]
+
+
+def test_http_handler_rejects_whole_batch(tmp_path):
+    notifier = make_notifier(tmp_path)
+    payload = [
+        {"order_group": 1, "chat_id": 5, "status": "delivered"},
+        {"order_group": 2, "chat_id": "x", "status": "delivered"},
+    ]
+    response = asyncio.run(notifier.http_handler(FakeRequest(payload)))
+    assert response.status == 400
+    assert notifier.pending == {}
+
+    response = asyncio.run(notifier.http_handler(FakeRequest(payload[:1])))
+    assert response.status == 200
+    assert json.loads(response.body) == {"accepted": 1}
+
+
+def test_http_handler_checks_secret(tmp_path):
+    notifier = make_notifier(tmp_path)
+    request = FakeRequest({"order_group": 1, "chat_id": 5, "status": "delivered"}, {"X-Notify-Secret": "no"})
+    response = asyncio.run(notifier.http_handler(request, secret="yes"))
+    assert response.status == 403
+    assert notifier.pending == {}
+
+
+def run_one_batch(notifier, bot):
+    async def run():
+        notifier._started_at = 0.0
+        task = asyncio.create_task(notifier.run_sender(bot))
+        while len(bot.calls) < len(notifier.pending):
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+        task.cancel()
+    asyncio.run(run())
+
+
+def test_run_sender_removes_only_delivered_events(tmp_path):
+    notifier = make_notifier(tmp_path)
+    notifier.push({"order_group": 1, "chat_id": 5, "status": "delivered"})
+    notifier.push({"order_group": 2, "chat_id": 6, "status": "delivered"})
+    late = {"order_group": 3, "chat_id": 5, "status": "cancelled"}
+    bot = FakeBot(notifier, fail={6}, arrive=late)
+    run_one_batch(notifier, bot)
+
+    assert bot.sent == [5]
+    # 5-chat: yuborilgan hodisa o'chirildi, yuborish paytida kelgani navbatda qoldi
+    assert notifier.pending["5"] == [{"order_group": "3", "status": "cancelled"}]
+    # 6-chat: xato bo'ldi, qayta urinish uchun navbatda qoladi
+    assert notifier.pending["6"] == [{"order_group": "2", "status": "delivered"}]
+    assert notifier.attempts == {"6": 1}
+    assert notifier.sent == 1
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from snapshot import StateSnapshot
+
+PRODUCT = {"id": 7, "name": "Olma", "price": "1200.00", "description": None}
+
+
+def make_snapshot(path, lazy_threshold=1024 * 1024):
+    stores = {"selected": {}, "cart": {}, "address": {}}
+    return StateSnapshot(str(path), stores, MemoryStorage(), lazy_threshold=lazy_threshold), stores
+
+
+def fill(snapshot, stores):
+    stores["cart"]["1"] = {7: {"product": PRODUCT, "quantity": 2}}
+    stores["selected"]["1"] = {"product": PRODUCT, "quantity": 1}
+    stores["address"]["2"] = "Toshkent"
+    key = StorageKey(bot_id=1, chat_id=1, user_id=1)
+    asyncio.run(snapshot.storage.set_state(key, "OrderStates:WAITING_FOR_ADDRESS"))
+    return key
+
+
+@pytest.mark.parametrize("lazy_threshold", [1024 * 1024, 0])
+def test_roundtrip_keeps_key_types(tmp_path, lazy_threshold):
+    path = tmp_path / "state.snapshot"
+    snapshot, stores = make_snapshot(path)
+    key = fill(snapshot, stores)
+    assert snapshot.dump() == (2, 1)
+
+    restored, restored_stores = make_snapshot(path, lazy_threshold)
+    assert restored.restore() == (2, lazy_threshold == 0)
+    # FSM holati lazy rejimda ham darhol tiklanadi
+    assert asyncio.run(restored.storage.get_state(key)) == "OrderStates:WAITING_FOR_ADDRESS"
+    restored.hydrate("1")
+    restored.hydrate("2")
+    assert restored_stores == stores
+    assert list(restored_stores["cart"]["1"]) == [7]
+
+
+def test_restore_rejects_foreign_file(tmp_path):
+    path = tmp_path / "state.snapshot"
+    path.write_bytes(b"\x80\x04" + b"\x00" * 32)
+    snapshot, _ = make_snapshot(path)
+    with pytest.raises(ValueError):
+        snapshot.restore()
+
+
+def test_drain_waits_for_tasks_not_yet_in_middleware(tmp_path):
+    snapshot, stores = make_snapshot(tmp_path / "state.snapshot")
+
+    async def handler(event, data):
+        await asyncio.sleep(0.01)
+        stores["address"]["1"] = "Samarqand"
+
+    async def run():
+        # Vazifa yaratilgan, lekin middleware'ga hali kirmagan
+        task = asyncio.create_task(snapshot.middleware(handler, None, {}))
+        unfinished = await snapshot.drain(1, tasks={task})
+        return unfinished
+
+    assert asyncio.run(run()) == 0
+    assert stores["address"] == {"1": "Samarqand"}
+
+
+def test_drain_reports_unfinished_after_timeout(tmp_path):
+    snapshot, _ = make_snapshot(tmp_path / "state.snapshot")
+
+    async def handler(event, data):
+        await asyncio.sleep(1)
+
+    async def run():
+        task = asyncio.create_task(snapshot.middleware(handler, None, {}))
+        unfinished = await snapshot.drain(0.01, tasks={task})
+        task.cancel()
+        return unfinished
+
+    assert asyncio.run(run()) == 1